@@ -1,13 +1,56 @@
+"""Persistent cache for quizml.
+
+Rendered equations (and other expensive intermediate results) are stored
+in a single SQLite database in the user cache directory. The database is
+opened in WAL mode so that concurrent quizml processes (e.g. a watch-mode
+session and a one-off build) can read and write it at the same time.
+
+Older versions of quizml stored one `<sha256>.json` file per entry in the
+cache directory. These files are imported into the database the first
+time it is opened, and then removed (unless they cannot be imported).
+
+The cache is bounded by a byte budget (`DEFAULT_MAX_SIZE`, or the
+`cache_max_size` config key). Every lookup refreshes the access time of
+the entries it returns, and least-recently-used entries are evicted
+whenever a write pushes the cache over budget.
+
+Typical usage example:
+
+    keys = [compute_hash(eq, settings) for eq in eq_list]
+    cached = get_many(keys)
+    ...
+    put_many({key: html for key, html in new_entries})
+
+Binary data (e.g. pickled documents) is stored with put_blob/get_blob.
+
+"""
+
 import functools
 import hashlib
 import json
 import logging
 import os
+import re
+import sqlite3
+import threading
+import time
 from pathlib import Path
 
 import appdirs
 
 CACHE_DIR = appdirs.user_cache_dir("quizml")
+CACHE_DB_FILENAME = "cache.sqlite"
+CACHE_SCHEMA_VERSION = 2
+
+DEFAULT_MAX_SIZE = 512 * 1024**2
+
+# max number of keys per "IN (...)" query (older SQLite builds are
+# limited to 999 bound parameters per statement)
+QUERY_CHUNK_SIZE = 500
+
+_max_size = DEFAULT_MAX_SIZE
+_connection = None
+_lock = threading.RLock()
 
 
 @functools.lru_cache(maxsize=1)
@@ -26,30 +69,351 @@ def compute_hash(content, settings_str=""):
     return m.hexdigest()
 
 
-def get_from_cache(key):
-    """Retrieves data from cache if it exists."""
-    cache_path = get_cache_dir() / f"{key}.json"
+def _connect():
+    """Returns the (shared) connection to the cache database.
+
+    The database is created on first use and any legacy JSON cache files
+    are migrated into it.
+    """
+    global _connection
+
+    if _connection is not None:
+        return _connection
+
+    db_path = get_cache_dir() / CACHE_DB_FILENAME
+    conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    _init_schema(conn)
+    _connection = conn
+
+    migrate_legacy_cache()
+
+    return _connection
+
+
+def _init_schema(conn):
+    """Creates the cache tables, upgrading databases from older versions."""
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+
+    with conn:
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS entries "
+            "(key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+        )
+        if version < 2:
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(entries)")}
+            if "size" not in columns:
+                conn.execute(
+                    "ALTER TABLE entries ADD COLUMN size INTEGER NOT NULL DEFAULT 0"
+                )
+                conn.execute("UPDATE entries SET size = length(value)")
+            if "atime" not in columns:
+                conn.execute(
+                    "ALTER TABLE entries ADD COLUMN atime REAL NOT NULL DEFAULT 0"
+                )
+        conn.execute("CREATE INDEX IF NOT EXISTS entries_atime ON entries (atime)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS counters "
+            "(name TEXT PRIMARY KEY, value INTEGER NOT NULL)"
+        )
+        conn.execute(f"PRAGMA user_version = {CACHE_SCHEMA_VERSION}")
+
 
-    if cache_path.exists():
+def parse_size(size):
+    """Converts a size such as `500MB`, `2G` or `1048576` into bytes."""
+    if isinstance(size, (int, float)):
+        return int(size)
+
+    m = re.fullmatch(r"\s*(\d+(?:\.\d+)?)\s*([kmgt]?)i?b?\s*", str(size), re.IGNORECASE)
+    if not m:
+        raise ValueError(f"invalid cache size: '{size}'")
+
+    factor = 1024 ** " kmgt".index(m.group(2).lower() or " ")
+    return int(float(m.group(1)) * factor)
+
+
+def format_size(nbytes):
+    """Converts a number of bytes into a human readable string."""
+    for unit in ["B", "KB", "MB", "GB"]:
+        if nbytes < 1024 or unit == "GB":
+            return f"{nbytes:.0f} {unit}" if unit == "B" else f"{nbytes:.1f} {unit}"
+        nbytes /= 1024
+
+
+def set_max_size(size):
+    """Sets the byte budget of the cache (e.g. `500MB`)."""
+    global _max_size
+    _max_size = parse_size(size)
+
+
+def get_max_size():
+    """Returns the byte budget of the cache."""
+    return _max_size
+
+
+def close_cache():
+    """Closes the connection to the cache database (if open)."""
+    global _connection
+    with _lock:
+        if _connection is not None:
+            _connection.close()
+            _connection = None
+
+
+def migrate_legacy_cache():
+    """Imports the legacy one-JSON-file-per-entry cache into the database.
+
+    Returns:
+        the number of migrated entries.
+    """
+    cache_dir = get_cache_dir()
+    legacy_files = list(cache_dir.glob("*.json"))
+    if not legacy_files:
+        return 0
+
+    logging.info(f"Migrating {len(legacy_files)} legacy cache files to {CACHE_DB_FILENAME}")
+
+    items = {}
+    migrated_files = []
+    for path in legacy_files:
         try:
-            return json.loads(cache_path.read_text())
+            items[path.stem] = json.loads(path.read_text())
+            migrated_files.append(path)
         except (json.JSONDecodeError, OSError):
+            logging.warning(f"Failed to read legacy cache file {path.name}, keeping it")
+
+    # the legacy files are only removed once their entries are saved
+    if not put_many(items):
+        return 0
+
+    for path in migrated_files:
+        try:
+            path.unlink()
+        except OSError:
+            logging.warning(f"Failed to remove legacy cache file {path.name}")
+
+    return len(items)
+
+
+def get_many(keys):
+    """Retrieves several entries from the cache in a single transaction.
+
+    Args:
+        keys: an iterable of cache keys.
+
+    Returns:
+        a dictionary mapping each key found in the cache to its data.
+        Missing keys are absent from the dictionary.
+    """
+    keys = list(dict.fromkeys(keys))
+    if not keys:
+        return {}
+
+    found = {}
+    rows = []
+    now = time.time()
+    try:
+        with _lock:
+            conn = _connect()
+            with conn:
+                for i in range(0, len(keys), QUERY_CHUNK_SIZE):
+                    chunk = keys[i : i + QUERY_CHUNK_SIZE]
+                    placeholders = ",".join("?" * len(chunk))
+                    rows += conn.execute(
+                        f"SELECT key, value FROM entries WHERE key IN ({placeholders})",
+                        chunk,
+                    ).fetchall()
+                    conn.execute(
+                        f"UPDATE entries SET atime = ? WHERE key IN ({placeholders})",
+                        [now, *chunk],
+                    )
+                _increment_counters(
+                    conn, hits=len(rows), misses=len(keys) - len(rows)
+                )
+    except sqlite3.Error as err:
+        logging.warning(f"Failed to read cache: {err}")
+        return found
+
+    for key, value in rows:
+        try:
+            found[key] = json.loads(value)
+        except ValueError:
             logging.warning(f"Failed to read cache for {key}")
-            return None
-    return None
+    return found
+
+
+def put_many(items):
+    """Saves several entries to the cache in a single transaction.
+
+    Args:
+        items: a dictionary mapping cache keys to JSON-serialisable data.
+
+    Returns:
+        True if the entries were saved, False if the cache could not be
+        written.
+    """
+    if not items:
+        return True
+
+    now = time.time()
+    rows = []
+    for key, data in items.items():
+        value = json.dumps(data)
+        rows.append((key, value, len(value.encode("utf-8")), now))
+
+    try:
+        with _lock:
+            conn = _connect()
+            with conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO entries (key, value, size, atime) "
+                    "VALUES (?, ?, ?, ?)",
+                    rows,
+                )
+                _evict(conn, _max_size)
+    except sqlite3.Error as err:
+        logging.warning(f"Failed to write cache: {err}")
+        return False
+    return True
+
+
+def get_blob(key):
+    """Retrieves a binary entry (see put_blob) from the cache.
+
+    Returns:
+        the bytes of the entry, or None if it is not in the cache.
+    """
+    now = time.time()
+    try:
+        with _lock:
+            conn = _connect()
+            with conn:
+                row = conn.execute(
+                    "SELECT value FROM entries WHERE key = ?", (key,)
+                ).fetchone()
+                if row is not None:
+                    conn.execute("UPDATE entries SET atime = ? WHERE key = ?", (now, key))
+                _increment_counters(
+                    conn, hits=int(row is not None), misses=int(row is None)
+                )
+    except sqlite3.Error as err:
+        logging.warning(f"Failed to read cache: {err}")
+        return None
+
+    if row is None or not isinstance(row[0], bytes):
+        return None
+    return row[0]
+
+
+def put_blob(key, data):
+    """Saves binary data (bytes) to the cache, alongside the JSON entries.
+
+    Binary entries count towards the cache size, and are evicted in the
+    same way.
+    """
+    try:
+        with _lock:
+            conn = _connect()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO entries (key, value, size, atime) "
+                    "VALUES (?, ?, ?, ?)",
+                    (key, sqlite3.Binary(data), len(data), time.time()),
+                )
+                _evict(conn, _max_size)
+    except sqlite3.Error as err:
+        logging.warning(f"Failed to write cache: {err}")
+
+
+def _increment_counters(conn, **counts):
+    conn.executemany(
+        "INSERT INTO counters (name, value) VALUES (?, ?) "
+        "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+        list(counts.items()),
+    )
+
+
+def _evict(conn, max_size):
+    """Deletes least-recently-used entries until the cache fits in max_size.
+
+    Returns:
+        the number of deleted entries.
+    """
+    total = conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+    if total <= max_size:
+        return 0
+
+    to_delete = []
+    for key, size in conn.execute("SELECT key, size FROM entries ORDER BY atime"):
+        if total <= max_size:
+            break
+        to_delete.append((key,))
+        total -= size
+
+    conn.executemany("DELETE FROM entries WHERE key = ?", to_delete)
+    logging.debug(f"Evicted {len(to_delete)} cache entries")
+    return len(to_delete)
+
+
+def prune_cache(max_size=None):
+    """Evicts least-recently-used entries until the cache fits in max_size.
+
+    Args:
+        max_size: target size (e.g. `100MB`). Defaults to the cache budget.
+
+    Returns:
+        the number of deleted entries.
+    """
+    max_size = _max_size if max_size is None else parse_size(max_size)
+    with _lock:
+        conn = _connect()
+        with conn:
+            deleted = _evict(conn, max_size)
+        conn.execute("VACUUM")
+    return deleted
+
+
+def get_cache_stats():
+    """Returns a dictionary of statistics about the cache."""
+    with _lock:
+        conn = _connect()
+        entries, size = conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+        ).fetchone()
+        counters = dict(conn.execute("SELECT name, value FROM counters"))
+
+    hits = counters.get("hits", 0)
+    misses = counters.get("misses", 0)
+    lookups = hits + misses
+    db_path = get_cache_dir() / CACHE_DB_FILENAME
+
+    return {
+        "path": str(db_path),
+        "entries": entries,
+        "bytes": size,
+        "file_bytes": db_path.stat().st_size if db_path.exists() else 0,
+        "max_bytes": _max_size,
+        "hits": hits,
+        "misses": misses,
+        "hit_ratio": hits / lookups if lookups else 0.0,
+    }
+
+
+def get_from_cache(key):
+    """Retrieves data from cache if it exists."""
+    return get_many([key]).get(key)
 
 
 def save_to_cache(key, data):
     """Saves data to cache."""
-    cache_path = get_cache_dir() / f"{key}.json"
-    try:
-        cache_path.write_text(json.dumps(data))
-    except OSError:
-        logging.warning(f"Failed to write cache for {key}")
+    put_many({key: data})
 
 
 def clear_cache():
     """Clears the cache directory."""
     import shutil
 
+    close_cache()
     shutil.rmtree(CACHE_DIR, ignore_errors=True)
+    get_cache_dir.cache_clear()
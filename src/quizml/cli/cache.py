@@ -0,0 +1,61 @@
+from rich import print
+from rich.panel import Panel
+from rich.table import Table, box
+
+from quizml import cache
+from quizml.cli.config import get_config
+from quizml.cli.errorhandler import print_error
+from quizml.exceptions import QuizMLConfigError
+
+
+def print_cache_stats():
+    """prints a table with the statistics of the persistent cache."""
+
+    stats = cache.get_cache_stats()
+
+    table = Table(
+        box=box.SIMPLE, collapse_padding=True, show_footer=False, show_header=False
+    )
+    table.add_column("Name", no_wrap=True, justify="left")
+    table.add_column("Value", no_wrap=True, justify="left")
+
+    table.add_row("location", stats["path"])
+    table.add_row("entries", f"{stats['entries']}")
+    table.add_row("size", cache.format_size(stats["bytes"]))
+    table.add_row("size on disk", cache.format_size(stats["file_bytes"]))
+    table.add_row("size limit", cache.format_size(stats["max_bytes"]))
+    table.add_row("hits / misses", f"{stats['hits']} / {stats['misses']}")
+    table.add_row("hit ratio", f"{100 * stats['hit_ratio']:.1f}%")
+
+    print(Panel(table, title="Cache", border_style="magenta"))
+
+
+def cache_command(args):
+    """
+    manages the persistent cache.
+    called with the --cache {stats,prune,clear} flag.
+    """
+
+    # the config file may set the cache size limit
+    try:
+        get_config(args)
+    except QuizMLConfigError as err:
+        print_error(str(err), title="QuizML Config Error")
+        return
+
+    if args.cache == "stats":
+        print_cache_stats()
+
+    elif args.cache == "prune":
+        try:
+            target_size = cache.parse_size(args.cache_size) if args.cache_size else None
+        except ValueError as err:
+            print_error(str(err), title="Cache Error")
+            return
+        deleted = cache.prune_cache(target_size)
+        print(f"Pruned {deleted} cache entries.")
+        print_cache_stats()
+
+    elif args.cache == "clear":
+        cache.clear_cache()
+        print(f"Cleared cache at {cache.CACHE_DIR}")
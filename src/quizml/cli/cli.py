@@ -91,12 +91,27 @@ def main():
         help=f"user config file. Default location is {default_config_dir}",
     )
 
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        metavar="N",
+        type=int,
+        help="number of parallel jobs used to compile targets and equations, "
+        "and to validate large quizzes (default: number of CPUs)",
+    )
+
     parser.add_argument(
         "--build",
         help="compiles all targets and run all post-compilation commands",
         action="store_true",
     )
 
+    parser.add_argument(
+        "--force",
+        help="compiles all targets, even those that are up to date",
+        action="store_true",
+    )
+
     parser.add_argument(
         "--diff",
         help="compares questions from first yaml file to rest of files",
@@ -117,7 +132,19 @@ def main():
     )
 
     parser.add_argument(
-        "--info", help="print configuration info and paths as json", action="store_true"
+        "--info", help="print configuration info, paths and tool versions as json", action="store_true"
+    )
+
+    parser.add_argument(
+        "--cache",
+        choices=["stats", "prune", "clear"],
+        help="show cache statistics, prune the cache to its size limit, or clear it",
+    )
+
+    parser.add_argument(
+        "--cache-size",
+        metavar="SIZE",
+        help="target size used by '--cache prune' (e.g. 200MB)",
     )
 
     parser.add_argument(
@@ -167,13 +194,21 @@ def main():
         if args.info:
             import json
 
+            import quizml.cli.config
             import quizml.cli.filelocator
+            import quizml.markdown.latextools
 
             try:
                 config_file = quizml.cli.filelocator.locate.path("quizml.cfg")
             except FileNotFoundError:
                 config_file = "not found"
 
+            try:
+                # applies the tool_paths of the config file
+                quizml.cli.config.get_config(args)
+            except QuizMLError:
+                pass
+
             info = {
                 "version": version("quizml"),
                 "cwd": quizml.cli.filelocator.locate.cw_dir,
@@ -183,10 +218,17 @@ def main():
                 "package_templates": quizml.cli.filelocator.locate.pkg_template_dir,
                 "search_paths": quizml.cli.filelocator.locate.dirlist,
                 "config_file": config_file,
+                "tools": quizml.markdown.latextools.get_tool_info(),
             }
             sys.stdout.write(json.dumps(info, indent=4) + "\n")
             return
 
+        if args.cache:
+            import quizml.cli.cache
+
+            quizml.cli.cache.cache_command(args)
+            return
+
         if args.shell_completion:
             import quizml.cli.shellcompletion
 
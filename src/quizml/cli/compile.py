@@ -22,6 +22,13 @@ from quizml.cli.livereload import (
     start_livereload_server,
     update_timestamp,
 )
+from quizml.cli.manifest import (
+    BuildManifest,
+    get_common_fingerprint,
+    get_target_fingerprints,
+    get_target_name,
+)
+from quizml.cli.scheduler import FAIL, OK, SKIP, UP_TO_DATE, Task, get_deps, run_tasks
 from quizml.cli.ui import (
     add_hyperlinks,
     print_quiet_ouputs,
@@ -36,6 +43,7 @@ from quizml.exceptions import (
     QuizMLError,
 )
 from quizml.loader import QuizMLYamlSyntaxError, load
+from quizml.markdown import latextools
 
 
 def compile_cmd_target(target):
@@ -51,46 +59,104 @@ def compile_cmd_target(target):
 
         return False
 
+    except OSError as e:
+        print_error(str(e), title="Failed to build command")
 
-def compile_target(target, transcoder, extra_context=None):
-    """compiles one target"""
+        return False
 
-    try:
-        yaml_transcoded = transcoder.transcode_target(target)
-        rendered_doc = renderer.render(
-            yaml_transcoded, target["template"], extra_context
-        )
 
-        if isinstance(rendered_doc, bytes):
-            pathlib.Path(target["out"]).write_bytes(rendered_doc)
-        else:
-            pathlib.Path(target["out"]).write_text(rendered_doc)
+def run_reporting_errors(func, *args):
+    """calls func(*args) and prints any quizml error it raises.
+
+    Returns:
+        a (success, result) pair.
+    """
 
-        success = True
+    try:
+        return True, func(*args)
 
     except LatexEqError as err:
         print_error(str(err), title="Latex Error")
-        success = False
     except MarkdownError as err:
         print_error(str(err), title="Markdown Error")
-        success = False
     except FileNotFoundError as err:
         print_error(str(err), title="FileNotFoundError Error")
-        success = False
     except Jinja2SyntaxError as err:
         print_error(
             f"\n did not generate target because of template errors ! \n {err}",
             title="Jinja Template Error",
         )
-        success = False
     except QuizMLError as err:
         print_error(str(err), title="QuizML Error")
-        success = False
     except KeyboardInterrupt:
         print("[bold red] KeyboardInterrupt [/bold red]")
-        success = False
 
-    return success
+    return False, None
+
+
+def write_target(target, yaml_transcoded, extra_context=None):
+    """renders the template of a target and writes its output file"""
+
+    if target.get("stream", False):
+        # renders the document straight to the output file
+        renderer.render_to_file(
+            yaml_transcoded, target["template"], target["out"], extra_context
+        )
+    else:
+        rendered_doc = renderer.render(
+            yaml_transcoded, target["template"], extra_context
+        )
+
+        if isinstance(rendered_doc, bytes):
+            pathlib.Path(target["out"]).write_bytes(rendered_doc)
+        else:
+            pathlib.Path(target["out"]).write_text(rendered_doc)
+
+
+def prepare_target(target, transcoder, extra_context=None):
+    """transcodes the markdown of a target, and returns the job that
+    renders it (or None if the transcoding failed).
+
+    The transcoding must run on the main thread (mistletoe is not
+    thread-safe), while the returned job can run in any thread.
+    """
+
+    success, yaml_transcoded = run_reporting_errors(
+        transcoder.transcode_target, target
+    )
+    if not success:
+        return None
+
+    def render_job():
+        success, _ = run_reporting_errors(
+            write_target, target, yaml_transcoded, extra_context
+        )
+        return success
+
+    return render_job
+
+
+def compile_target(target, transcoder, extra_context=None):
+    """compiles one target"""
+
+    render_job = prepare_target(target, transcoder, extra_context)
+    return render_job is not None and render_job()
+
+
+def get_target_task(target, transcoder, extra_context=None):
+    """returns the scheduler task of a target"""
+
+    name = get_target_name(target)
+    deps = get_deps(target)
+
+    if "template" in target:
+        return Task(
+            name,
+            deps=deps,
+            prepare=lambda: prepare_target(target, transcoder, extra_context),
+        )
+
+    return Task(name, deps=deps, run=lambda: compile_cmd_target(target))
 
 
 def compile(args):
@@ -118,7 +184,7 @@ def compile(args):
     # load QuizMLYaml file
     try:
         yaml_data, schema = load(
-            args.yaml_filename, validate=True, schema_path=schema_path
+            args.yaml_filename, validate=True, schema_path=schema_path, jobs=args.jobs
         )
     except (QuizMLYamlSyntaxError, FileNotFoundError) as err:
         print_error(str(err), title="QuizMLYaml Syntax Error")
@@ -146,60 +212,79 @@ def compile(args):
         print_error(str(err), title="Template NotFoundError")
         return
 
+    # number of parallel jobs for compiling equations
+    for target in target_list:
+        target["jobs"] = args.jobs
+
     # Prepare LiveReload if watching
     extra_context = {}
     if args.watch:
         start_livereload_server()
+        latextools.start_worker_pool(args.jobs)
         port = get_livereload_port()
         if port:
             extra_context["livereload_port"] = port
 
+    # build targets (eg. compile pdf of generated latex) only require
+    # the execution of an external command, and are skipped unless
+    # the build option is on
+    target_list = [
+        target
+        for target in target_list
+        if "template" in target or ("build_cmd" in target and (args.build or args.target))
+    ]
+
+    # targets whose inputs have not changed since their last build are
+    # skipped, unless the build is forced
+    manifest = BuildManifest(args.yaml_filename)
+    common_fingerprint = get_common_fingerprint(
+        args.yaml_filename,
+        schema_path,
+        config,
+        transcoder.get_image_paths(),
+        extra_context,
+    )
+    fingerprints = get_target_fingerprints(target_list, common_fingerprint)
+
+    # runs independent targets concurrently, each target waiting for
+    # its dependency (`dep`) to compile successfully
+    tasks = [get_target_task(target, transcoder, extra_context) for target in target_list]
+    for target, task in zip(target_list, tasks):
+        task.up_to_date = not args.force and manifest.is_up_to_date(
+            target, fingerprints[task.name]
+        )
+
+    run_tasks(tasks, jobs=args.jobs or os.cpu_count())
+
+    for target, task in zip(target_list, tasks):
+        if task.status == OK:
+            manifest.record(target, fingerprints[task.name])
+    manifest.save()
+
     # sets up list of the output for each build
     targets_output = []
     targets_quiet_output = []
-    success_list = {}
-
-    for _i, target in enumerate(target_list):
-        # skipping build target if build option is not on
-        if ("build_cmd" in target) and not (args.build or args.target):
-            continue
-
-        # a build target (eg. compile pdf of generated latex) a build
-        # target only requires the execution of an external command,
-        # ie. no python code required
-        #
-        if ("build_cmd" in target) and (args.build or args.target):
-            # need to check if there is a dependency,
-            # and if this dependency compiled successfully
-
-            if ("dep" not in target) or (
-                "dep" in target and success_list.get(target["dep"], False)
-            ):
-                success = compile_cmd_target(target)
-            else:
-                success = False
-
-        # a template task that needs to be rendered
-        if "template" in target:
-            success = compile_target(target, transcoder, extra_context)
-
-        success_list[target["name"]] = success
+
+    for target, task in zip(target_list, tasks):
+        status = {OK: "", UP_TO_DATE: "", FAIL: "[FAIL]", SKIP: "[SKIP]"}[task.status]
+        if task.status == UP_TO_DATE:
+            wall_time = "up to date"
+        else:
+            wall_time = f"{task.wall_time:.2f}s"
 
         targets_output.append(
             [
                 target["descr"],
                 add_hyperlinks(target["descr_cmd"], target["out"]),
-                "" if success else "[FAIL]",
+                status,
+                wall_time,
             ]
         )
 
         targets_quiet_output.append(
-            [add_hyperlinks(target["out"], target["out"]), "" if success else "[FAIL]"]
+            [add_hyperlinks(target["out"], target["out"]), status]
         )
 
-        if not success:
-            break
-
     # Update timestamp for LiveReload clients
     update_timestamp()
 
@@ -252,5 +337,6 @@ def compile_on_change(args):
     except KeyboardInterrupt:
         print("[bold red]Stopping watch mode...[/bold red]")
         observer.stop()
+        latextools.stop_worker_pool()
 
     observer.join()
@@ -7,7 +7,9 @@ from ruamel.yaml import YAML
 from ruamel.yaml.error import YAMLError
 
 import quizml.cli.filelocator as filelocator
+from quizml import cache
 from quizml.exceptions import QuizMLConfigError
+from quizml.markdown import latextools
 
 
 def get_config(args):
@@ -35,6 +37,19 @@ def get_config(args):
 
     config["yaml_filename"] = args.yaml_filename
 
+    # byte budget of the persistent cache
+    if "cache_max_size" in config:
+        try:
+            cache.set_max_size(config["cache_max_size"])
+        except ValueError as err:
+            raise QuizMLConfigError(f"Invalid cache_max_size in {config_file}: {err}") from err
+
+    # explicit paths of the external tools (pdflatex, gs, latex, ...)
+    tool_paths = config.get("tool_paths") or {}
+    if not isinstance(tool_paths, dict):
+        raise QuizMLConfigError(f"Invalid tool_paths in {config_file}: expected a mapping")
+    latextools.set_tool_paths(tool_paths)
+
     return config
 
 
@@ -93,9 +108,10 @@ def get_target_list(args, config, yaml_data):
 
         target = {}
 
-        # resolves $inputbasename
+        # resolves $inputbasename (non-string options, such as
+        # `eq_bisect: false`, are kept as is)
         for key, val in t.items():
-            target[key] = Template(val).substitute(subs)
+            target[key] = Template(val).substitute(subs) if isinstance(val, str) else val
 
         # resolves relative path for all files
         for key in filenames_to_resolve:
@@ -0,0 +1,182 @@
+"""Build manifest for incremental builds.
+
+For each quiz, the manifest records, per target, a fingerprint of all the
+inputs of the target (the YAML file, the template files, the CSS and
+preamble, the schema, the referenced images, the config and the quizml
+version), and the size and mtime of the output it produced.
+
+A target is up to date if its fingerprint is unchanged and its output
+is still the one it produced. The fingerprint of a build target (eg.
+latexmk) includes the fingerprints of its dependencies, so that it is
+rebuilt whenever one of them is.
+
+Manifests are stored in the quizml cache dir, keyed by the absolute
+path of the YAML file.
+
+Typical usage example:
+
+    manifest = BuildManifest(yaml_filename)
+    if not manifest.is_up_to_date(target, fingerprint):
+        ... build target ...
+        manifest.record(target, fingerprint)
+    manifest.save()
+
+"""
+
+import hashlib
+import json
+import logging
+import os
+from importlib.metadata import version
+from pathlib import Path
+
+from quizml import renderer
+from quizml.cache import get_cache_dir
+from quizml.cli.scheduler import get_deps
+
+MANIFEST_VERSION = 1
+
+# target keys that have no effect on the output
+IGNORED_TARGET_KEYS = {"jobs", "descr", "descr_cmd"}
+
+
+def hash_file(path):
+    """returns the SHA256 of a file content (or 'missing')."""
+
+    m = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                m.update(chunk)
+    except OSError:
+        return "missing"
+    return m.hexdigest()
+
+
+def hash_data(data):
+    """returns the SHA256 of JSON-serialisable data."""
+
+    dump = json.dumps(data, sort_keys=True, default=str)
+    return hashlib.sha256(dump.encode("utf-8")).hexdigest()
+
+
+def get_common_fingerprint(yaml_filename, schema_path, config, image_paths, extra_context=None):
+    """returns the fingerprint of the inputs shared by all the targets."""
+
+    return hash_data(
+        {
+            "manifest": MANIFEST_VERSION,
+            "quizml": version("quizml"),
+            "yaml": hash_file(yaml_filename),
+            "schema": hash_file(schema_path),
+            "config": config,
+            "images": {str(path): hash_file(path) for path in image_paths},
+            "extra_context": extra_context or {},
+        }
+    )
+
+
+def get_target_fingerprint(target, common_fingerprint, template_files=(), dep_fingerprints=()):
+    """returns the fingerprint of all the inputs of a target.
+
+    The CSS and preamble contents are already part of the target (see
+    get_target_list).
+    """
+
+    options = {k: v for k, v in target.items() if k not in IGNORED_TARGET_KEYS}
+    return hash_data(
+        {
+            "common": common_fingerprint,
+            "target": options,
+            "templates": {str(path): hash_file(path) for path in template_files},
+            "deps": list(dep_fingerprints),
+        }
+    )
+
+
+def get_target_name(target):
+    return target.get("name", target["out"])
+
+
+def get_target_fingerprints(target_list, common_fingerprint):
+    """returns the fingerprint of each target, keyed by target name."""
+
+    targets = {get_target_name(target): target for target in target_list}
+    fingerprints = {}
+
+    def fingerprint(name, visiting=()):
+        if name in fingerprints:
+            return fingerprints[name]
+        target = targets.get(name)
+        if target is None or name in visiting:
+            return None
+
+        dep_fingerprints = [fingerprint(dep, visiting + (name,)) for dep in get_deps(target)]
+        template_files = []
+        if "template" in target:
+            template_files = renderer.get_template_files(target["template"])
+
+        fingerprints[name] = get_target_fingerprint(
+            target, common_fingerprint, template_files, dep_fingerprints
+        )
+        return fingerprints[name]
+
+    for name in targets:
+        fingerprint(name)
+    return fingerprints
+
+
+def get_output_stat(out):
+    """returns the [size, mtime_ns] of an output file, or None."""
+
+    try:
+        st = os.stat(out)
+    except OSError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+
+class BuildManifest:
+    """The record of the last successful build of each target of a quiz."""
+
+    def __init__(self, yaml_filename):
+        key = hashlib.sha256(os.path.abspath(yaml_filename).encode("utf-8"))
+        self.path = get_cache_dir() / "manifests" / f"{key.hexdigest()[:32]}.json"
+        self.entries = {}
+
+        try:
+            data = json.loads(self.path.read_text())
+            if data.get("version") == MANIFEST_VERSION:
+                self.entries = data.get("targets", {})
+        except FileNotFoundError:
+            pass
+        except (OSError, ValueError, AttributeError) as err:
+            logging.warning(f"Failed to read build manifest {self.path}: {err}")
+
+    def is_up_to_date(self, target, fingerprint):
+        """True if the target was built from the same inputs, and its
+        output has not changed since."""
+
+        entry = self.entries.get(get_target_name(target))
+        if not entry or entry.get("fingerprint") != fingerprint:
+            return False
+        stat = get_output_stat(target["out"])
+        return stat is not None and entry.get("out") == stat
+
+    def record(self, target, fingerprint):
+        """records a successful build of the target."""
+
+        self.entries[get_target_name(target)] = {
+            "fingerprint": fingerprint,
+            "out": get_output_stat(target["out"]),
+        }
+
+    def save(self):
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(f".{os.getpid()}.tmp")
+            data = {"version": MANIFEST_VERSION, "targets": self.entries}
+            Path(tmp_path).write_text(json.dumps(data, indent=1))
+            os.replace(tmp_path, self.path)
+        except OSError as err:
+            logging.warning(f"Failed to write build manifest {self.path}: {err}")
@@ -0,0 +1,163 @@
+"""Dependency-aware scheduler for the compilation targets.
+
+The targets of the config file form a DAG through their `dep` key (eg.
+the `pdf` target runs latexmk on the output of the `latex` target).
+Targets whose dependencies have succeeded are run concurrently in a
+thread pool, and the targets that depend on a failed target are skipped,
+while the other branches carry on.
+
+A task may have a `prepare` step that runs on the main thread, in
+order. It is used for the Markdown transcoding, as mistletoe keeps its
+token lists in global state and cannot be used from several threads.
+
+Typical usage example:
+
+    tasks = [
+        Task("latex", prepare=lambda: transcode_and_get_render_job("latex")),
+        Task("pdf", run=lambda: run_latexmk(), deps=["latex"]),
+    ]
+    run_tasks(tasks, jobs=4)
+    print([(task.name, task.status, task.wall_time) for task in tasks])
+
+"""
+
+import logging
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+OK = "ok"
+FAIL = "fail"
+SKIP = "skip"
+UP_TO_DATE = "up-to-date"
+
+
+class Task:
+    """A target to be run by the scheduler.
+
+    Attributes:
+        name: the target name, as referenced by the `dep` of other tasks
+        deps: the names of the tasks that must succeed before this one
+        prepare: optional function, called on the main thread, that
+            returns the function to run in the pool (or None if it failed)
+        run: the function to run in the pool, if there is no prepare step.
+            It returns True on success.
+        up_to_date: if True, the task is not run (unless a dependency fails)
+        status: OK, FAIL, SKIP or UP_TO_DATE once the task is finished
+        wall_time: time spent preparing and running the task, in seconds
+    """
+
+    def __init__(self, name, run=None, deps=(), prepare=None, up_to_date=False):
+        self.name = name
+        self.run = run
+        self.deps = list(deps)
+        self.prepare = prepare
+        self.up_to_date = up_to_date
+        self.status = None
+        self.wall_time = 0.0
+
+    def __repr__(self):
+        return f"Task({self.name!r}, deps={self.deps!r}, status={self.status!r})"
+
+
+def get_deps(target):
+    """returns the list of dependencies of a target (`dep` can be a single
+    target name or a list of names)."""
+
+    dep = target.get("dep")
+    if not dep:
+        return []
+    if isinstance(dep, list):
+        return dep
+    return [dep]
+
+
+def _run_timed(job):
+    """runs a job, and returns its result and end time."""
+    return job(), time.perf_counter()
+
+
+def run_tasks(tasks, jobs=None):
+    """runs all the tasks, as concurrently as their dependencies allow.
+
+    Tasks are started in list order, at most `jobs` at a time. A task
+    whose dependencies did not all succeed (or are not in the list) is
+    skipped, and a task marked as up to date is not run. The status and
+    wall time of each task are set on the task.
+
+    Args:
+        tasks: the list of Task to run
+        jobs: the maximum number of tasks running at the same time
+            (defaults to the ThreadPoolExecutor default)
+    """
+
+    pending = list(tasks)
+    running = {}
+    status = {}
+
+    def finish(future):
+        task, start = running.pop(future)
+        try:
+            success, end = future.result()
+        except Exception:
+            logging.exception(f"target '{task.name}' crashed")
+            success, end = False, time.perf_counter()
+        task.status = status[task.name] = OK if success else FAIL
+        task.wall_time = end - start
+
+    def next_ready_task():
+        waiting = {task.name for task in pending}
+        waiting |= {task.name for task, _ in running.values()}
+        for task in pending:
+            if not any(dep in waiting for dep in task.deps):
+                return task
+        return None
+
+    pool = ThreadPoolExecutor(max_workers=jobs, thread_name_prefix="quizml_target")
+    try:
+        while pending or running:
+            # collects the tasks that have finished in the meantime
+            for future in [f for f in running if f.done()]:
+                finish(future)
+
+            task = next_ready_task()
+
+            if task is None:
+                if running:
+                    finished, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                    for future in finished:
+                        finish(future)
+                    continue
+
+                # all the remaining tasks wait on each other
+                for task in pending:
+                    logging.warning(f"target '{task.name}' has circular dependencies")
+                    task.status = status[task.name] = SKIP
+                pending.clear()
+                break
+
+            pending.remove(task)
+
+            if any(status.get(dep) not in (OK, UP_TO_DATE) for dep in task.deps):
+                logging.info(f"skipping target '{task.name}' (failed dependency)")
+                task.status = status[task.name] = SKIP
+                continue
+
+            if task.up_to_date:
+                logging.info(f"target '{task.name}' is up to date")
+                task.status = status[task.name] = UP_TO_DATE
+                continue
+
+            start = time.perf_counter()
+            job = task.prepare() if task.prepare else task.run
+            if job is None:
+                task.status = status[task.name] = FAIL
+                task.wall_time = time.perf_counter() - start
+                continue
+
+            running[pool.submit(_run_timed, job)] = (task, start)
+
+    except KeyboardInterrupt:
+        pool.shutdown(wait=False, cancel_futures=True)
+        raise
+
+    pool.shutdown()
@@ -95,10 +95,13 @@ def print_table_ouputs(targets_output):
     table.add_column("Descr", no_wrap=True, justify="left")
     table.add_column("Cmd", no_wrap=True, justify="left")
     table.add_column("Status", no_wrap=True, justify="left")
+    table.add_column("Time", no_wrap=True, justify="right", style="grey50")
 
     for row in targets_output:
         if row[2] == "[FAIL]":
             table.add_row(*row, style="red")
+        elif row[2] == "[SKIP]":
+            table.add_row(*row, style="yellow")
         elif row[2] == "":
             table.add_row(*row)
 
@@ -109,5 +112,7 @@ def print_quiet_ouputs(targets_quiet_output):
     for row in targets_quiet_output:
         if row[1] == "[FAIL]":
             print("[bold red]x " + row[0] + "[/bold red]")
+        elif row[1] == "[SKIP]":
+            print("[bold yellow]-[/bold yellow] " + row[0])
         elif row[1] == "":
             print("[bold green]o[/bold green] " + row[0])
@@ -71,6 +71,22 @@ class LatexCompilationError(LatexToolError):
     pass
 
 
+class LatexEquationsError(LatexCompilationError):
+    """Raised when some LaTeX equations fail to compile.
+
+    Attributes:
+        failures: list of (equation, LaTeX error message) pairs.
+    """
+
+    def __init__(self, failures, message=None):
+        self.failures = failures
+        if message is None:
+            message = f"{len(failures)} equation(s) failed to compile:\n"
+            for eq, err in failures:
+                message += f"\n{eq}\n{err}\n"
+        super().__init__(message)
+
+
 class MarkdownAttributeError(MarkdownError):
     """Raised for errors related to Markdown attributes."""
 
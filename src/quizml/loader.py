@@ -19,18 +19,36 @@ Typical usage example:
 """
 
 import json
+import logging
 import os
+import pickle
 import re
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from importlib.metadata import version
 from pathlib import Path
 
 from jsonschema import Draft7Validator, validators
 from ruamel.yaml import YAML
-from ruamel.yaml.constructor import RoundTripConstructor
+from ruamel.yaml.constructor import BaseConstructor, RoundTripConstructor
 from ruamel.yaml.nodes import ScalarNode
 from ruamel.yaml.scalarstring import PlainScalarString
 
+from quizml.cache import compute_hash, get_blob, put_blob
 from quizml.exceptions import QuizMLYamlSyntaxError
-from quizml.utils import coerce_data, msg_context, text_wrap
+from quizml.utils import (
+    CoercionPlan,
+    coerce_data,
+    compile_conditions,
+    msg_context,
+    text_wrap,
+)
+
+try:
+    # optional: PyYAML with libyaml is used for fast loading if available
+    import yaml as pyyaml
+except ImportError:
+    pyyaml = None
 
 
 # --- Custom ruamel.yaml Constructor ---
@@ -59,6 +77,69 @@ StringConstructor.add_constructor(
 StringConstructor.add_constructor(
     "tag:yaml.org,2002:null", StringConstructor.construct_scalar
 )
+StringConstructor.add_constructor(
+    "tag:yaml.org,2002:timestamp", StringConstructor.construct_scalar
+)
+
+
+# --- Fast Loaders ---
+#
+# The round-trip loader is slow, and is only needed for the line numbers
+# of the error messages. YAML fragments are first loaded into plain
+# dicts/lists of strings with a base loader (libyaml-backed if PyYAML is
+# installed), and only loaded again with the round-trip loader if they
+# fail to parse or validate. Fragments with merge keys or duplicate keys
+# are also left to the round-trip loader, which handles them.
+
+
+class RoundTripRequired(Exception):
+    """Raised when a YAML fragment must be loaded with the round-trip loader."""
+
+
+def _check_mapping(mapping, node):
+    if "<<" in mapping or len(mapping) != len(node.value):
+        raise RoundTripRequired()
+    return mapping
+
+
+class BaseStringConstructor(BaseConstructor):
+    """ruamel.yaml base constructor (all scalars are loaded as strings)."""
+
+    def construct_mapping(self, node, deep=False):
+        return _check_mapping(super().construct_mapping(node, deep=deep), node)
+
+
+if pyyaml is not None and pyyaml.__with_libyaml__:
+
+    class LibyamlStringLoader(pyyaml.CBaseLoader):
+        """libyaml base loader (all scalars are loaded as strings)."""
+
+        def construct_mapping(self, node, deep=False):
+            return _check_mapping(super().construct_mapping(node, deep=deep), node)
+
+else:
+    LibyamlStringLoader = None
+
+
+def _fast_load(text):
+    """
+    Loads a YAML fragment into plain dicts/lists of strings.
+    Raises RoundTripRequired if the round-trip loader must be used instead.
+    """
+    try:
+        if LibyamlStringLoader is not None:
+            loader = LibyamlStringLoader(text)
+            try:
+                return loader.get_single_data()
+            finally:
+                loader.dispose()
+
+        yaml = YAML(typ="base")
+        yaml.Constructor = BaseStringConstructor
+        return yaml.load(text)
+    except Exception as err:
+        # syntax errors are reported by the round-trip loader
+        raise RoundTripRequired() from err
 
 
 # --- Custom jsonschema Validator and Type Conversion ---
@@ -121,11 +202,237 @@ DefaultFillingValidator = extend_with_default(
 )
 
 
-def _parse_yaml_fragment(text, validate=True, schema=None, filename="<string>"):
+class CompiledSchema:
+    """
+    A schema compiled once for validation and type coercion.
+
+    Holds the validator (whose resolver caches the `$ref` resolutions
+    across validations), the conditional branches of each question
+    type (see utils.compile_conditions) and the coercion plan (see
+    utils.CoercionPlan).
+    """
+
+    def __init__(self, schema, fingerprint=None):
+        self.schema = schema
+        self.validator = DefaultFillingValidator(schema)
+        self.branches = compile_conditions(schema)
+        self.plan = CoercionPlan(schema, self.branches)
+        if fingerprint is None:
+            fingerprint = compute_hash(json.dumps(schema, sort_keys=True))
+        self.fingerprint = fingerprint
+
+        # the questions are validated item by item (see validate_data)
+        self.items_schema = None
+        self.root_validator = None
+        items_schema = schema.get("items")
+        if schema.get("type") == "array" and isinstance(items_schema, dict):
+            self.items_schema = items_schema
+            self.root_validator = DefaultFillingValidator(
+                {key: value for key, value in schema.items() if key != "items"}
+            )
+
+
+# compiled schemas, keyed by (path, size, mtime_ns) of the schema file
+_schema_registry = {}
+
+
+def get_compiled_schema(schema_path):
     """
-    Parses a single YAML fragment.
-    Optionally validates against a schema (dict).
+    Returns the CompiledSchema of a schema file. The schema is only read
+    and compiled again if the file has changed.
     """
+    try:
+        st = os.stat(schema_path)
+    except (FileNotFoundError, NotADirectoryError) as err:
+        raise QuizMLYamlSyntaxError(f"Schema file not found: {schema_path}") from err
+    except TypeError as err:
+        raise QuizMLYamlSyntaxError(
+            "Schema must be provided for validation when validate=True."
+        ) from err
+
+    key = (os.path.abspath(schema_path), st.st_size, st.st_mtime_ns)
+    compiled = _schema_registry.get(key)
+    if compiled is not None:
+        return compiled
+
+    try:
+        schema_str = Path(schema_path).read_text()
+        schema = json.loads(schema_str)
+    except FileNotFoundError as err:
+        raise QuizMLYamlSyntaxError(f"Schema file not found: {schema_path}") from err
+    except json.JSONDecodeError as err:
+        raise QuizMLYamlSyntaxError(f"Invalid JSON in schema: {err}") from err
+
+    compiled = CompiledSchema(schema, fingerprint=compute_hash(schema_str))
+    # only the latest version of each schema file is kept
+    for old_key in [k for k in _schema_registry if k[0] == key[0]]:
+        del _schema_registry[old_key]
+    _schema_registry[key] = compiled
+    return compiled
+
+
+# --- Validation ---
+
+# minimum number of questions for validating them in a process pool
+PARALLEL_VALIDATION_MIN_ITEMS = 2000
+
+# maximum number of schema errors in a report
+MAX_REPORTED_ERRORS = 50
+
+# the keywords of the conditional branches of the item schema
+CONDITIONAL_KEYWORDS = ("allOf", "anyOf", "oneOf", "if", "then", "else")
+
+# the schema compiled in each validation worker process
+_worker_schema = None
+
+
+def _init_validation_worker(schema):
+    global _worker_schema
+    _worker_schema = CompiledSchema(schema)
+
+
+def _unique_errors(errors):
+    """returns the (path, message) pairs of schema errors, without
+    duplicates, in order."""
+    return list(dict.fromkeys((tuple(err.path), err.message) for err in errors))
+
+
+def _iter_item_errors(schema, items, start=0):
+    """yields the schema errors of a list of items (filling in defaults).
+
+    If an item fails the base item schema (eg. a missing or invalid
+    `type`), only these errors are reported, as the errors of the
+    conditional branches of each question type are then just noise.
+    """
+    for i, item in enumerate(items, start):
+        errors = list(schema.validator.descend(item, schema.items_schema, path=i))
+        base_errors = [
+            err
+            for err in errors
+            if (err.relative_schema_path[0] if err.relative_schema_path else None)
+            not in CONDITIONAL_KEYWORDS
+        ]
+        yield from _unique_errors(base_errors or errors)
+
+
+def _validate_chunk(start, items):
+    """validates a chunk of items in a worker process, and returns the
+    items (with their defaults filled in) and their errors."""
+    errors = list(_iter_item_errors(_worker_schema, items, start))
+    return items, errors
+
+
+def _validate_items_parallel(schema, items, jobs):
+    n_chunks = min(jobs, len(items) // (PARALLEL_VALIDATION_MIN_ITEMS // 2))
+    chunk_size = -(-len(items) // n_chunks)
+    starts = range(0, len(items), chunk_size)
+
+    errors = []
+    with ProcessPoolExecutor(
+        max_workers=n_chunks,
+        initializer=_init_validation_worker,
+        initargs=(schema.schema,),
+    ) as pool:
+        futures = [
+            pool.submit(_validate_chunk, start, items[start : start + chunk_size])
+            for start in starts
+        ]
+        for start, future in zip(starts, futures):
+            chunk, chunk_errors = future.result()
+            items[start : start + len(chunk)] = chunk
+            errors += chunk_errors
+    return errors
+
+
+def validate_data(schema, data, jobs=None):
+    """
+    Validates data against a CompiledSchema, filling in the defaults.
+
+    A list of questions is validated item by item, in a process pool for
+    large lists (see PARALLEL_VALIDATION_MIN_ITEMS), so that all the
+    errors are collected in one pass.
+
+    Returns:
+        the list of errors, as (path, message) pairs, in document order.
+    """
+    if schema.items_schema is None or not isinstance(data, list):
+        errors = sorted(schema.validator.iter_errors(data), key=lambda e: e.path)
+        return _unique_errors(errors)
+
+    errors = _unique_errors(schema.root_validator.iter_errors(data))
+
+    jobs = int(jobs or os.cpu_count() or 1)
+    if jobs > 1 and type(data) is list and len(data) >= PARALLEL_VALIDATION_MIN_ITEMS:
+        try:
+            return errors + _validate_items_parallel(schema, data, jobs)
+        except (OSError, BrokenProcessPool, pickle.PicklingError) as err:
+            logging.debug(f"parallel validation failed ({err}), validating serially")
+
+    errors += _iter_item_errors(schema, data)
+    return errors
+
+
+def _get_line_number(data, path):
+    """returns the line number of the node at path in round-trip data,
+    or 'unknown'."""
+    line_num = "unknown"
+    item = data
+    try:
+        if hasattr(item, "lc"):
+            line_num = item.lc.line + 1
+        for key in path:
+            if isinstance(item, dict):
+                line_num = item.lc.key(key)[0] + 1
+            else:
+                line_num = item.lc.item(key)[0] + 1
+            item = item[key]
+    except (KeyError, IndexError, AttributeError, TypeError):
+        pass
+    return line_num
+
+
+def format_schema_errors(errors, data, text, filename):
+    """returns the report of schema errors, each with its line number
+    and context (data is the round-trip data of text)."""
+    lines = text.splitlines()
+    blocks = []
+    for path, message in errors[:MAX_REPORTED_ERRORS]:
+        line_num = _get_line_number(data, path)
+        path_str = " -> ".join(map(str, path))
+        msg = f"Schema validation error in {filename} at '{path_str}' (line ~{line_num})\n"
+        if line_num != "unknown":
+            msg += msg_context(lines, line_num) + "\n"
+        msg += text_wrap(message)
+        blocks.append(msg)
+
+    if len(errors) > MAX_REPORTED_ERRORS:
+        blocks.append(f"... and {len(errors) - MAX_REPORTED_ERRORS} more errors")
+    return "\n\n".join(blocks)
+
+
+def _parse_yaml_fragment(
+    text, validate=True, schema=None, filename="<string>", fast=True, jobs=None
+):
+    """
+    Parses a single YAML fragment into plain dicts/lists.
+    Optionally validates against a schema (CompiledSchema), and reports
+    all the schema errors.
+
+    If fast, the fragment is loaded with a fast loader, and only loaded
+    again with the round-trip loader if it needs to report errors.
+    """
+
+    errors = None
+    if fast:
+        try:
+            data = _fast_load(text)
+            if not (validate and schema):
+                return data
+            errors = validate_data(schema, data, jobs)
+            if not errors:
+                return data
+        except RoundTripRequired:
+            pass
 
     # loading all scalars as strings
     yaml = YAML()
@@ -142,26 +449,12 @@ def _parse_yaml_fragment(text, validate=True, schema=None, filename="<string>"):
 
     # validating against the schema
     if validate and schema:
-        validator = DefaultFillingValidator(schema)
-        errors = sorted(validator.iter_errors(data), key=lambda e: e.path)
+        if errors is None:
+            errors = validate_data(schema, data, jobs=1)
         if errors:
-            err = errors[0]
-            path = " -> ".join(map(str, err.path))
-            try:
-                item = data
-                for key in err.path:
-                    item = item[key]
-                line_num = item.lc.line + 1
-            except (KeyError, IndexError, AttributeError):
-                line_num = "unknown"
-            lines = text.splitlines()
-            msg = f"Schema validation error in {filename} at '{path}' (line ~{line_num})\n"
-            if line_num != "unknown":
-                msg += msg_context(lines, line_num) + "\n"
-            msg += text_wrap(err.message)
-            raise QuizMLYamlSyntaxError(msg)
+            raise QuizMLYamlSyntaxError(format_schema_errors(errors, data, text, filename))
 
-    return data
+    return _to_plain_python(data)
 
 
 def _to_plain_python(data):
@@ -172,12 +465,24 @@ def _to_plain_python(data):
     return data
 
 
-def loads(quizmlyaml_txt, validate=True, schema=None, filename="<string>"):
+def loads(
+    quizmlyaml_txt, validate=True, schema=None, filename="<string>", fast=True, jobs=None
+):
     """
     Parses a QuizML string.
     Identifies header and questions documents, parses them, and returns the data structure.
+
+    The schema can be given as a dict, or as a CompiledSchema to avoid
+    compiling it again. If fast, the fast loaders are used whenever
+    possible (see _parse_yaml_fragment). `jobs` is the number of
+    processes used to validate large lists of questions.
     """
 
+    compiled = schema
+    if schema and not isinstance(schema, CompiledSchema):
+        compiled = CompiledSchema(schema)
+    schema = compiled.schema if compiled else schema
+
     # Extracting the header and questions
     yamldoc_pattern = re.compile(r"^---\s*$", re.MULTILINE)
     yamldocs = yamldoc_pattern.split(quizmlyaml_txt)
@@ -207,26 +512,55 @@ def loads(quizmlyaml_txt, validate=True, schema=None, filename="<string>"):
         header_doc, questions_doc = yamldocs[0], None
 
     doc["header"] = (
-        _parse_yaml_fragment(header_doc, validate=False, filename=filename)
+        _parse_yaml_fragment(header_doc, validate=False, filename=filename, fast=fast)
         if header_doc
         else {}
     )
 
     doc["questions"] = (
         _parse_yaml_fragment(
-            questions_doc, validate=validate, filename=filename, schema=schema
+            questions_doc,
+            validate=validate,
+            filename=filename,
+            schema=compiled,
+            fast=fast,
+            jobs=jobs,
         )
         if questions_doc
         else []
     )
 
-    doc = _to_plain_python(doc)
-    doc = coerce_data(doc, schema)
+    doc = coerce_data(doc, schema, compiled.plan if compiled else None)
 
     return doc, schema
 
 
-def load(quizmlyaml_path, validate=True, schema_path=None):
+# bump to invalidate the cached documents when the loader changes
+LOAD_CACHE_VERSION = 1
+
+
+def _get_cached_doc(key):
+    """returns the document cached under key, or None."""
+    blob = get_blob(key)
+    if blob is None:
+        return None
+    try:
+        return pickle.loads(blob)
+    except Exception as err:
+        logging.warning(f"Failed to read cached document: {err}")
+        return None
+
+
+def load(
+    quizmlyaml_path, validate=True, schema_path=None, fast=True, cache=True, jobs=None
+):
+    """
+    Loads a QuizML file (see loads).
+
+    If cache, the loaded document is cached (pickled) in the quizml
+    cache, keyed by the content of the file, the schema and the quizml
+    version, so that unchanged files are not parsed again.
+    """
     try:
         quizmlyaml_txt = Path(quizmlyaml_path).read_text()
     except FileNotFoundError as err:
@@ -238,24 +572,30 @@ def load(quizmlyaml_path, validate=True, schema_path=None):
             from quizml.cli.filelocator import locate
 
             schema_path = locate.path("schema.json")
-        try:
-            schema_str = Path(schema_path).read_text()
-            schema = json.loads(schema_str)
-        except FileNotFoundError as err:
-            raise QuizMLYamlSyntaxError(f"Schema file not found: {schema_path}") from err
-        except json.JSONDecodeError as err:
-            raise QuizMLYamlSyntaxError(f"Invalid JSON in schema: {err}") from err
-        except TypeError as err:
-            raise QuizMLYamlSyntaxError(
-                "Schema must be provided for validation when validate=True."
-            ) from err
-
-    doc, _ = loads(
-        quizmlyaml_txt, validate=validate, schema=schema, filename=str(quizmlyaml_path)
-    )
+        schema = get_compiled_schema(schema_path)
+
+    key = None
+    doc = None
+    if cache:
+        settings = f"{LOAD_CACHE_VERSION}\0{version('quizml')}\0"
+        settings += schema.fingerprint if schema else "no-validation"
+        key = compute_hash(quizmlyaml_txt, settings)
+        doc = _get_cached_doc(key)
+
+    if doc is None:
+        doc, _ = loads(
+            quizmlyaml_txt,
+            validate=validate,
+            schema=schema,
+            filename=str(quizmlyaml_path),
+            fast=fast,
+            jobs=jobs,
+        )
+        if key is not None:
+            put_blob(key, pickle.dumps(doc, protocol=pickle.HIGHEST_PROTOCOL))
 
     # passing the input quiz file's basename to header
     basename, _ = os.path.splitext(quizmlyaml_path)
     doc["header"]["inputbasename"] = basename
 
-    return doc, schema
\ No newline at end of file
+    return doc, schema.schema if schema else None
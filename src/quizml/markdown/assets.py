@@ -0,0 +1,89 @@
+"""Content-addressed image assets for HTML targets.
+
+By default, all the images of the HTML renders (figures and equations)
+are embedded as base64 data URIs, as required by BlackBoard. For local
+targets such as the HTML preview, the `assets` target option instead
+writes each image once into a `<basename>_assets/` directory, next to
+the output file, under a name derived from its content. The renders
+then reference the images by URL, which keeps the HTML small and lets
+the browser cache the images across rebuilds.
+
+The renders are cached with their data URIs (see
+MarkdownTranscoder.cached_entry_dict), and are externalized for each
+build, so that deleted asset files are written again.
+
+Typical usage example:
+
+    assets_dir = get_assets_dir("quiz.html")   # quiz_assets
+    html = externalize_data_uris(html, assets_dir)
+
+"""
+
+import base64
+import hashlib
+import logging
+import os
+import re
+from pathlib import Path
+
+from ..exceptions import MarkdownImageError
+
+DATA_URI_PATTERN = re.compile(r"data:image/([a-z+]+);base64,([A-Za-z0-9+/=]+)")
+
+# file extension of each image MIME subtype
+ASSET_EXTENSIONS = {"png": "png", "jpeg": "jpg", "svg+xml": "svg"}
+
+
+def get_assets_dir(out):
+    """returns the assets directory of an output file (eg. quiz.html =>
+    quiz_assets)."""
+
+    out = Path(out)
+    return out.with_name(out.stem + "_assets")
+
+
+def write_asset(assets_dir, subtype, data64):
+    """writes a base64 encoded image into the assets directory, unless it
+    is already there, and returns its file name."""
+
+    ext = ASSET_EXTENSIONS.get(subtype)
+    if ext is None:
+        raise MarkdownImageError(f"unsupported image type for assets: {subtype}")
+
+    name = hashlib.sha256(data64.encode("ascii")).hexdigest()[:32] + "." + ext
+    path = Path(assets_dir) / name
+    if not path.exists():
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f".{name}.{os.getpid()}.tmp")
+        tmp_path.write_bytes(base64.b64decode(data64))
+        os.replace(tmp_path, path)
+    return name
+
+
+def externalize_data_uris(html, assets_dir):
+    """replaces the image data URIs of a HTML string with the URLs of
+    their assets, relative to the output file.
+
+    Args:
+        html (str): the HTML string
+        assets_dir: the assets directory (see get_assets_dir)
+
+    Returns:
+        the HTML string with references to the assets
+    """
+
+    assets_dir = Path(assets_dir)
+
+    def replace(m):
+        name = write_asset(assets_dir, m.group(1), m.group(2))
+        return f"{assets_dir.name}/{name}"
+
+    return DATA_URI_PATTERN.sub(replace, html)
+
+
+def externalize_dict(md_dict, assets_dir):
+    """returns a copy of a dictionary of HTML renders, with their data
+    URIs replaced by assets (see externalize_data_uris)."""
+
+    logging.debug(f"[assets] writing images to {assets_dir}")
+    return {md: externalize_data_uris(html, assets_dir) for md, html in md_dict.items()}
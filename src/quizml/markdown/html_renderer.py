@@ -1,19 +1,39 @@
 import base64
+import functools
 import html
 import logging
+import os
 import re
+from concurrent.futures import ThreadPoolExecutor
 
 import css_inline
-from bs4 import BeautifulSoup
 from mistletoe import span_token
+from mistletoe.block_token import Heading
 from mistletoe.html_renderer import HTMLRenderer
 
-from ..cache import compute_hash, get_from_cache, save_to_cache
-from ..exceptions import LatexCompilationError, MarkdownAttributeError
+from ..cache import compute_hash, get_many, put_many
+from ..exceptions import (
+    LatexCompilationError,
+    LatexEquationsError,
+    MarkdownAttributeError,
+    MarkdownError,
+)
 from .extensions import ImageWithWidth, MathDisplay, MathInline
-from .image_embedding import embed_base64
-from .latextools import LatexRunner
-from .utils import append_unique, get_hash
+from .image_embedding import embed_base64, embed_image, rasterize_many
+from .latextools import LatexRunner, take_warm_worker
+from .mathml import latex_to_mathml
+from .utils import append_unique, get_hash, split_sections
+
+# minimum number of equations per compilation shard
+MIN_EQS_PER_SHARD = 8
+
+# the heading of each entry section of the combined document
+SECTION_HEADING_PATTERN = re.compile(r"<h1(?:\s[^>]*)?>\s*([0-9a-f]{32})\s*</h1>")
+
+# the container of each entry while the CSS is inlined, so that structural
+# selectors (eg. p:first-child, h1 + p) only match within each entry
+ENTRY_TAG = "quizml-entry"
+ENTRY_OPENING_PATTERN = re.compile(r"<quizml-entry\b[^>]*\bdata-hash=\"([0-9a-f]{32})\"[^>]*>")
 
 
 def get_eq_list_from_doc(doc):
@@ -31,6 +51,41 @@ def get_eq_list_from_doc(doc):
     return eq_list
 
 
+def get_image_srcs_from_doc(doc):
+    """returns the list of the sources of all the images in a markdown
+    document (mistletoe object)."""
+
+    srcs = []
+    if isinstance(doc, (span_token.Image, ImageWithWidth)):
+        srcs.append(doc.src)
+    if hasattr(doc, "children") and doc.children is not None:
+        for a in doc.children:
+            srcs = append_unique(srcs, get_image_srcs_from_doc(a))
+    return srcs
+
+
+def get_eq_sources(combined_doc):
+    """returns a dictionary that maps the content of each LaTeX equation
+    of the combined document to the hash of the Markdown entry (ie. the
+    section of the combined document) it comes from.
+
+    """
+
+    eq_sources = {}
+    section_hash = None
+    for block in combined_doc.children:
+        if isinstance(block, Heading) and block.level == 1 and block.children:
+            section_hash = getattr(block.children[0], "content", section_hash)
+            continue
+        for eq in get_eq_list_from_doc(block):
+            eq_sources.setdefault(eq.content, section_hash)
+    return eq_sources
+
+
+# <code> elements, whose newlines must be kept (as <br>)
+CODE_PATTERN = re.compile(r"(<code\b[^>]*>.*?</code>)", re.DOTALL | re.IGNORECASE)
+
+
 def strip_newlines_and_tabs(html_content):
     """removes all newline and tab characters from an HTML string.
 
@@ -43,17 +98,17 @@ def strip_newlines_and_tabs(html_content):
     '\n' with <br> so as preserve formatting inside these verbatim
     blocks.
 
+    The string is split into <code> elements and the text between them
+    in a single pass, without parsing the HTML.
     """
 
-    htmlsrc = BeautifulSoup(html_content, "html.parser")
-    for code in htmlsrc.find_all(name="code"):
-        s = BeautifulSoup(str(code).replace("\n", "<br>"), "html.parser")
-        code.replace_with(s)
-
-    html_content = str(htmlsrc)
+    # odd chunks are <code> elements
+    chunks = CODE_PATTERN.split(html_content)
+    for i in range(1, len(chunks), 2):
+        chunks[i] = chunks[i].replace("\n", "<br/>")
 
     # now we can delete any spurious '\n' or '\t'
-
+    html_content = "".join(chunks)
     html_content = html_content.replace("\n", " ").replace("\t", "  ")
 
     return html_content
@@ -99,8 +154,209 @@ def escape_LaTeX(str_eq):
     return str_eq
 
 
-def build_eq_dict_PNG(eq_list, opts):
-    """returns a dictionary of images from a list of LaTeX equations.
+def get_eq_key(eq):
+    """returns the key of a LaTeX equation in the equation dictionary."""
+
+    if isinstance(eq, MathInline):
+        return "##Inline##" + eq.content
+    return "##Display##" + eq.content
+
+
+def lookup_eq_cache(eq_list, settings_str):
+    """looks up a list of LaTeX equations in the persistent cache.
+
+    All the equations are fetched with a single cache query.
+
+    Returns:
+        the dictionary of the cached renders, the list of the equations
+        that still need to be compiled, and a dictionary of the cache
+        keys of all the equations.
+    """
+
+    hashes = {eq.content: compute_hash(eq.content, settings_str) for eq in eq_list}
+    cached = get_many(hashes.values())
+
+    eq_dict = {}
+    to_compile = []
+    for eq in eq_list:
+        cached_html = cached.get(hashes[eq.content])
+        if cached_html:
+            eq_dict[get_eq_key(eq)] = cached_html
+        else:
+            to_compile.append(eq)
+
+    return eq_dict, to_compile, hashes
+
+
+def split_into_shards(eq_list, jobs=None):
+    """splits a list of equations into (at most) `jobs` contiguous
+    shards. Shards hold at least MIN_EQS_PER_SHARD equations, so that
+    small batches are not split at all.
+
+    """
+
+    jobs = int(jobs or os.cpu_count() or 1)
+    n_shards = max(1, min(jobs, len(eq_list) // MIN_EQS_PER_SHARD))
+    shard_size = -(-len(eq_list) // n_shards)
+    return [
+        eq_list[i : i + shard_size] for i in range(0, len(eq_list), shard_size)
+    ]
+
+
+def compile_eq_batches(compile_shard, batches, jobs=None):
+    """compiles each batch of equations concurrently with `compile_shard`,
+    running at most `jobs` batches at a time.
+
+    Returns:
+        a list of (batch, result) pairs, where result is either the list
+        of renders of the batch or the LatexCompilationError it raised.
+    """
+
+    def compile_batch(batch):
+        try:
+            return batch, compile_shard(batch)
+        except LatexCompilationError as err:
+            return batch, err
+
+    jobs = int(jobs or os.cpu_count() or 1)
+    if len(batches) == 1 or jobs == 1:
+        return [compile_batch(batch) for batch in batches]
+
+    with ThreadPoolExecutor(max_workers=min(len(batches), jobs)) as pool:
+        return list(pool.map(compile_batch, batches))
+
+
+def get_error_signature(err):
+    """returns the signature of a LaTeX compilation error: its first error
+    line ('! ...') and the line where it occurred ('l.N <context>').
+
+    An error in the preamble has the same signature in every batch,
+    whereas the errors of different equations (even with the same
+    message) have a different line and context.
+    """
+
+    lines = [line.strip() for line in str(err).splitlines()]
+    message = next((line for line in lines if line.startswith("!")), None)
+    if message is None:
+        return str(err).strip()
+    location = next((line for line in lines if re.match(r"l\.\d+", line)), "")
+    return message + "\n" + location
+
+
+def compile_eq_shards(compile_shard, eq_list, opts):
+    """compiles a list of LaTeX equations with `compile_shard`.
+
+    The list is split into shards that are compiled concurrently, each
+    shard running in its own LatexRunner. The number of shards, and of
+    concurrent compilations, is bounded by `opts['jobs']`.
+
+    When a shard fails to compile, it is bisected (unless
+    `opts['eq_bisect']` is false) and the halves are compiled again, in
+    parallel, until the failing equations are isolated. This way, all the
+    valid equations still get rendered.
+
+    If all the shards, or both halves of a bisected batch, fail with the
+    same error at the same place (see get_error_signature), the error is not caused by a particular equation (eg. an
+    error in the preamble, or a macro used everywhere), and the batch is
+    not bisected any further.
+
+    Returns:
+        a dictionary of the renders (keyed as in the equation dictionary)
+        and the list of (equations, LatexCompilationError) failures.
+    """
+
+    bisect = opts.get("eq_bisect", True)
+    jobs = opts.get("jobs")
+    shards = split_into_shards(eq_list, jobs)
+    if len(shards) > 1:
+        logging.info(f"compiling {len(eq_list)} equations in {len(shards)} shards")
+
+    renders = {}
+    failures = []
+
+    # the batches to compile, grouped by siblings (the shards, or the
+    # two halves of a bisected batch)
+    groups = [shards]
+    while groups:
+        results = iter(compile_eq_batches(compile_shard, sum(groups, []), jobs))
+        next_groups = []
+        for group in groups:
+            failed = []
+            for batch, result in [next(results) for _ in group]:
+                if isinstance(result, LatexCompilationError):
+                    failed.append((batch, result))
+                else:
+                    renders.update(zip(map(get_eq_key, batch), result))
+
+            if failed and not bisect:
+                raise failed[0][1]
+
+            signatures = {get_error_signature(err) for _, err in failed}
+            if len(group) > 1 and len(failed) == len(group) and len(signatures) == 1:
+                failures.append(([eq for batch, _ in failed for eq in batch], failed[0][1]))
+                continue
+
+            for batch, err in failed:
+                if len(batch) == 1:
+                    failures.append((batch, err))
+                else:
+                    mid = len(batch) // 2
+                    next_groups.append([batch[:mid], batch[mid:]])
+
+        groups = next_groups
+        if groups:
+            logging.info(f"isolating LaTeX errors: compiling {2 * len(groups)} batches")
+
+    return renders, failures
+
+
+def build_eq_dict(eq_list, opts, settings_str, compile_shard):
+    """returns a dictionary of renders from a list of LaTeX equations.
+
+    Equations are first looked up in the cache; the remaining ones are
+    compiled with `compile_shard` and saved to the cache.
+
+    Raises:
+        LatexEquationsError: if some equations failed to compile. The
+        equations that compiled are still saved to the cache.
+    """
+
+    eq_dict, to_compile, hashes = lookup_eq_cache(eq_list, settings_str)
+
+    if not to_compile:
+        return eq_dict
+
+    renders, failures = compile_eq_shards(compile_shard, to_compile, opts)
+
+    new_entries = {}
+    for eq in to_compile:
+        key = get_eq_key(eq)
+        if key in renders:
+            logging.debug(f"[eq] '{renders[key]}'")
+            eq_dict[key] = renders[key]
+            new_entries[hashes[eq.content]] = renders[key]
+
+    # Save to cache
+    put_many(new_entries)
+
+    if failures:
+        reported = []
+        for eqs, err in failures:
+            message = str(err)
+            if len(eqs) > 1:
+                message = (
+                    f"{len(eqs)} equations (from this one) failed to compile with "
+                    "the same error, which is probably not caused by a particular "
+                    f"equation (check the preamble and macros):\n{message}"
+                )
+            reported.append((eqs[0].content, message))
+        raise LatexEquationsError(reported)
+
+    return eq_dict
+
+
+def compile_eqs_PNG(eq_list, latex_preamble):
+    """compiles a list of LaTeX equations into PNG <img> tags.
 
     LaTeX equations are compiled into a PDF document using pdflatex,
     with one equation per page.
@@ -108,8 +364,59 @@ def build_eq_dict_PNG(eq_list, opts):
     The PDF is then converted into PNG images using ghostscript (gs).
 
     """
-    eq_dict = {}
 
+    latex_body = ""
+    for eq in eq_list:
+        if isinstance(eq, MathInline):
+            latex_body += "\\setbox0=\\hbox{" + eq.content + "}\n"
+            latex_body += (
+                "\\makeatletter\\typeout{:::"
+                " \\strip@pt\\dimexpr 1pt * \\dp0 / \\wd0\\relax}\\makeatother\n"
+            )
+            latex_body += "\\begin{standalone}\\copy0\\end{standalone}\n"
+        if isinstance(eq, MathDisplay):
+            latex_body += "\\typeout{::: 0}\n"
+            latex_body += "\\begin{standalone}" + eq.content + "\\end{standalone}\n"
+
+    latex_content = latex_preamble + latex_body + "\\end{document}\n"
+
+    renders = []
+    with take_warm_worker("pdflatex", latex_preamble) or LatexRunner() as latex_runner:
+        pdf_filename, depthratio = latex_runner.run_pdflatex(
+            latex_content, preamble=latex_preamble
+        )
+        png_files = latex_runner.run_gs_png(pdf_filename)
+
+        for i, (eq, png_file) in enumerate(zip(eq_list, png_files)):
+            w, h, data64 = embed_base64(png_file)
+            d = depthratio[i]
+            d_ = round(d * w * 0.5, 2)
+            w_ = round(w / 2)
+            h_ = round(h / 2)
+
+            if isinstance(eq, MathInline):
+                html_img = (
+                    f"<img src='{data64}'"
+                    f" alt='{escape_LaTeX(eq.content)}'"
+                    f" width='{w_}' height='{h_}'"
+                    f" style='vertical-align:{-d_}px;'>"
+                )
+            else:
+                html_img = (
+                    f"<img src='{data64}'"
+                    f" alt='{escape_LaTeX(eq.content)}'"
+                    f" width='{w_}' height='{h_}'>"
+                )
+            renders.append(html_img)
+
+    return renders
+
+
+def build_eq_dict_PNG(eq_list, opts):
+    """returns a dictionary of PNG images from a list of LaTeX equations.
+
+    See compile_eqs_PNG.
+    """
     # if we don't have any equations, exit with empty dict
     if not eq_list:
         return eq_list
@@ -135,96 +442,55 @@ def build_eq_dict_PNG(eq_list, opts):
         + "\\begin{document}\n"
     )
 
-    # Check cache first
     settings_str = latex_preamble + "PNG"
-    to_compile = []
+    compile_shard = functools.partial(compile_eqs_PNG, latex_preamble=latex_preamble)
 
-    for eq in eq_list:
-        h = compute_hash(eq.content, settings_str)
-        cached_html = get_from_cache(h)
+    return build_eq_dict(eq_list, opts, settings_str, compile_shard)
 
-        if isinstance(eq, MathInline):
-            key = "##Inline##" + eq.content
-        else:
-            key = "##Display##" + eq.content
 
-        if cached_html:
-            eq_dict[key] = cached_html
-        else:
-            to_compile.append(eq)
+def compile_eqs_SVG(eq_list, latex_preamble):
+    """compiles a list of LaTeX equations into SVG <img> tags.
 
-    if not to_compile:
-        return eq_dict
+    LaTeX equations are compiled into a DVI document using latex,
+    with one equation per page.
+
+    The DVI is then converted into SVG images using dvisvgm.
+    """
 
     latex_body = ""
-    for eq in to_compile:
+    for eq in eq_list:
         if isinstance(eq, MathInline):
-            latex_body += "\\setbox0=\\hbox{" + eq.content + "}\n"
+            latex_body += "\\sbox{0}{" + eq.content + "}\n"
+            latex_body += "\\ifdim\\dimexpr\\ht0-\\dp0>4.8pt\n"
+            latex_body += "\\dp0\\dimexpr\\ht0-4.8pt\\fi\n"
             latex_body += (
-                "\\makeatletter\\typeout{:::"
-                " \\strip@pt\\dimexpr 1pt * \\dp0 / \\wd0\\relax}\\makeatother\n"
+                "\\begin{standalone}\\setlength\\fboxrule{0.00001pt}"
+                "\\setlength\\fboxsep{0pt}\\fbox{\\usebox{0}}\\end{standalone}\n"
             )
-            latex_body += "\\begin{standalone}\\copy0\\end{standalone}\n"
         if isinstance(eq, MathDisplay):
-            latex_body += "\\typeout{::: 0}\n"
             latex_body += "\\begin{standalone}" + eq.content + "\\end{standalone}\n"
 
     latex_content = latex_preamble + latex_body + "\\end{document}\n"
 
-    try:
-        with LatexRunner() as latex_runner:
-            pdf_filename, depthratio = latex_runner.run_pdflatex(latex_content)
-            png_files = latex_runner.run_gs_png(pdf_filename)
-
-            for i, (eq, png_file) in enumerate(zip(to_compile, png_files)):
-                w, h, data64 = embed_base64(png_file)
-                d = depthratio[i]
-                d_ = round(d * w * 0.5, 2)
-                w_ = round(w / 2)
-                h_ = round(h / 2)
-
-                html_img = ""
-                if isinstance(eq, MathInline):
-                    key = "##Inline##" + eq.content
-                    html_img = (
-                        f"<img src='{data64}'"
-                        f" alt='{escape_LaTeX(eq.content)}'"
-                        f" width='{w_}' height='{h_}'"
-                        f" style='vertical-align:{-d_}px;'>"
-                    )
-                    logging.debug(f"[eq-inline] '{html_img}'")
-                    eq_dict[key] = html_img
-                else:
-                    key = "##Display##" + eq.content
-                    html_img = (
-                        f"<img src='{data64}'"
-                        f" alt='{escape_LaTeX(eq.content)}'"
-                        f" width='{w_}' height='{h_}'>"
-                    )
-                    logging.debug(f"[eq-display] '{html_img}'")
-                    eq_dict[key] = html_img
-
-                # Save to cache
-                h = compute_hash(eq.content, settings_str)
-                save_to_cache(h, html_img)
-
-    except LatexCompilationError as e:
-        # Re-raise to be caught by the CLI
-        raise e
+    renders = []
+    with take_warm_worker("latex", latex_preamble) or LatexRunner() as latex_runner:
+        dvi_path = latex_runner.run_latex_dvi(latex_content, preamble=latex_preamble)
+        svg_files = latex_runner.run_dvisvgm_svg(dvi_path)
 
-    return eq_dict
+        for eq, svg_file in zip(eq_list, svg_files):
+            _, _, data64 = embed_base64(svg_file)
+            alt_text = escape_LaTeX(eq.content)
+            style = "vertical-align:middle;"
+            renders.append(f"<img src='{data64}' alt='{alt_text}' style='{style}'>")
 
+    return renders
 
-def build_eq_dict_SVG(eq_list, opts):
-    """returns a dictionary of images from a list of LaTeX equations.
 
-    LaTeX equations are compiled into a DVI document using latex,
-    with one equation per page.
+def build_eq_dict_SVG(eq_list, opts):
+    """returns a dictionary of SVG images from a list of LaTeX equations.
 
-    The DVI is then converted into SVG images using dvisvgm.
+    See compile_eqs_SVG.
     """
-    eq_dict = {}
-
     if not eq_list:
         return eq_list
 
@@ -245,78 +511,38 @@ def build_eq_dict_SVG(eq_list, opts):
     )
 
     settings_str = latex_preamble + "SVG"
-    to_compile = []
+    compile_shard = functools.partial(compile_eqs_SVG, latex_preamble=latex_preamble)
 
-    for eq in eq_list:
-        h = compute_hash(eq.content, settings_str)
-        cached_html = get_from_cache(h)
-        if isinstance(eq, MathInline):
-            key = "##Inline##" + eq.content
-        else:
-            key = "##Display##" + eq.content
+    return build_eq_dict(eq_list, opts, settings_str, compile_shard)
 
-        if cached_html:
-            eq_dict[key] = cached_html
-        else:
-            to_compile.append(eq)
 
-    if not to_compile:
-        return eq_dict
+def compile_eqs_MathML(eq_list, latex_preamble):
+    """compiles a list of LaTeX equations into MathML using make4ht."""
 
-    latex_body = ""
-    for eq in to_compile:
-        if isinstance(eq, MathInline):
-            latex_body += "\\sbox{0}{" + eq.content + "}\n"
-            latex_body += "\\ifdim\\dimexpr\\ht0-\\dp0>4.8pt\n"
-            latex_body += "\\dp0\\dimexpr\\ht0-4.8pt\\fi\n"
-            latex_body += (
-                "\\begin{standalone}\\setlength\\fboxrule{0.00001pt}"
-                "\\setlength\\fboxsep{0pt}\\fbox{\\usebox{0}}\\end{standalone}\n"
-            )
-        if isinstance(eq, MathDisplay):
-            latex_body += "\\begin{standalone}" + eq.content + "\\end{standalone}\n"
-
-    latex_content = latex_preamble + latex_body + "\\end{document}\n"
+    latex_body = "\n".join(eq.content for eq in eq_list)
+    latex_content = latex_preamble + latex_body + "\n\\end{document}\n"
 
-    try:
-        with LatexRunner() as latex_runner:
-            dvi_path = latex_runner.run_latex_dvi(latex_content)
-            svg_files = latex_runner.run_dvisvgm_svg(dvi_path)
-
-            for eq, svg_file in zip(to_compile, svg_files):
-                _, _, data64 = embed_base64(svg_file)
-                alt_text = escape_LaTeX(eq.content)
-                style = "vertical-align:middle;"
-
-                html_img = ""
-                if isinstance(eq, MathInline):
-                    key = "##Inline##" + eq.content
-                    html_img = f"<img src='{data64}' alt='{alt_text}' style='{style}'>"
-                    logging.debug(f"[eq-inline] '{html_img}'")
-                    eq_dict[key] = html_img
-                else:
-                    key = "##Display##" + eq.content
-                    html_img = f"<img src='{data64}' alt='{alt_text}' style='{style}'>"
-                    logging.debug(f"[eq-display] '{html_img}'")
-                    eq_dict[key] = html_img
+    with LatexRunner() as latex_runner:
+        html_path = latex_runner.run_make4ht_mathml(latex_content)
+        make4ht_out = html_path.read_text()
 
-                # Save cache
-                h = compute_hash(eq.content, settings_str)
-                save_to_cache(h, html_img)
+    regex = r"(<math.*?<\/math>)"
+    eq_list_str = re.findall(regex, make4ht_out, re.DOTALL)
 
-    except LatexCompilationError as e:
-        raise e
+    if len(eq_list_str) != len(eq_list):
+        raise LatexCompilationError(
+            "Mismatch between number of equations and make4ht output.\n"
+            f"Expected {len(eq_list)}, got {len(eq_list_str)}."
+        )
 
-    return eq_dict
+    return eq_list_str
 
 
 def build_eq_dict_MathML(eq_list, opts):
     """returns a dictionary of MATHML eqs from a list of LaTeX equations.
 
-    LaTeX equations are compiled into MATHML using make4ht.
+    See compile_eqs_MathML.
     """
-    eq_dict = {}
-
     if not eq_list:
         return eq_list
 
@@ -331,57 +557,37 @@ def build_eq_dict_MathML(eq_list, opts):
     )
 
     settings_str = latex_preamble + "MathML"
-    to_compile = []
+    compile_shard = functools.partial(compile_eqs_MathML, latex_preamble=latex_preamble)
 
-    for eq in eq_list:
-        h = compute_hash(eq.content, settings_str)
-        cached_html = get_from_cache(h)
-        if isinstance(eq, MathInline):
-            key = "##Inline##" + eq.content
-        else:
-            key = "##Display##" + eq.content
+    return build_eq_dict(eq_list, opts, settings_str, compile_shard)
 
-        if cached_html:
-            eq_dict[key] = cached_html
-        else:
-            to_compile.append(eq)
-
-    if not to_compile:
-        return eq_dict
 
-    latex_body = "\n".join(eq.content for eq in to_compile)
-    latex_content = latex_preamble + latex_body + "\n\\end{document}\n"
-
-    try:
-        with LatexRunner() as latex_runner:
-            html_path = latex_runner.run_make4ht_mathml(latex_content)
-            make4ht_out = html_path.read_text()
-
-            regex = r"(<math.*?<\/math>)"
-            eq_list_str = re.findall(regex, make4ht_out, re.DOTALL)
-
-            if len(eq_list_str) != len(to_compile):
-                raise LatexCompilationError(
-                    "Mismatch between number of equations and make4ht output.\n"
-                    f"Expected {len(to_compile)}, got {len(eq_list_str)}."
-                )
+def build_eq_dict_MathML_fast(eq_list, opts):
+    """returns a dictionary of MATHML eqs from a list of LaTeX equations.
 
-            for i, eq in enumerate(to_compile):
-                mathml = eq_list_str[i]
-                h = compute_hash(eq.content, settings_str)
-                save_to_cache(h, mathml)
+    Equations are converted in-process with latex2mathml (see
+    mathml.latex_to_mathml). The equations that use unsupported macros
+    or environments are compiled with make4ht instead (see
+    build_eq_dict_MathML).
+    """
+    if not eq_list:
+        return eq_list
 
-                if isinstance(eq, MathInline):
-                    key = "##Inline##" + eq.content
-                    logging.debug(f"[eq-inline] '{mathml}'")
-                    eq_dict[key] = mathml
-                else:
-                    key = "##Display##" + eq.content
-                    logging.debug(f"[eq-display] '{mathml}'")
-                    eq_dict[key] = mathml
+    eq_dict = {}
+    fallback = []
+    for eq in eq_list:
+        mathml = latex_to_mathml(eq.content)
+        if mathml is None:
+            fallback.append(eq)
+        else:
+            eq_dict[get_eq_key(eq)] = mathml
 
-    except LatexCompilationError as e:
-        raise e
+    if fallback:
+        logging.info(
+            f"{len(fallback)} equation(s) not supported by the fast MathML "
+            "converter, compiling them with make4ht"
+        )
+        eq_dict.update(build_eq_dict_MathML(fallback, opts))
 
     return eq_dict
 
@@ -395,9 +601,10 @@ class QuizMLYamlHTMLRenderer(HTMLRenderer):
 
     """
 
-    def __init__(self, eq_dict):
+    def __init__(self, eq_dict, assets=False):
         super().__init__(MathInline, MathDisplay, ImageWithWidth)
         self.eq_dict = eq_dict
+        self.assets = assets
 
     def render_math_inline(self, token):
         return self.eq_dict["##Inline##" + token.content]
@@ -411,11 +618,11 @@ class QuizMLYamlHTMLRenderer(HTMLRenderer):
             title = f' title="{html.escape(token.title)}"'
         else:
             title = ""
-        [w, h, data64] = embed_base64(token.src)
+        [w, h, data64] = embed_image(token.src)
         return template.format(data64, self.render_to_plain(token), title)
 
     def render_image_with_width(self, token) -> str:
-        [w, h, data64_img] = embed_base64(token.src)
+        [w, h, data64_img] = embed_image(token.src)
 
         width_attr_str = token.width.strip()
 
@@ -434,6 +641,11 @@ class QuizMLYamlHTMLRenderer(HTMLRenderer):
 
         height_attr = width_attr / w * h
 
+        # images written as assets are referenced by URL, which an SVG
+        # loaded as an image cannot do
+        if self.assets:
+            return f'<img src="{data64_img}" width={width_attr} height="{height_attr}">'
+
         template = (
             f'<svg width="{width_attr}" height="{height_attr}" '
             f'xmlns="http://www.w3.org/2000/svg">'
@@ -476,22 +688,22 @@ def get_html(doc, opts):
         eq_dict = build_eq_dict_SVG(eq_list, opts)
     elif opts.get("fmt", "") == "html-mathml":
         eq_dict = build_eq_dict_MathML(eq_list, opts)
+    elif opts.get("fmt", "") == "html-mathml-fast":
+        eq_dict = build_eq_dict_MathML_fast(eq_list, opts)
     else:
         eq_dict = build_eq_dict_PNG(eq_list, opts)
 
-    with QuizMLYamlHTMLRenderer(eq_dict) as renderer:
+    # the PDF figures are converted concurrently before the render
+    pdf_srcs = [src for src in get_image_srcs_from_doc(doc) if src.lower().endswith(".pdf")]
+    rasterize_many(pdf_srcs, opts.get("jobs"))
+
+    with QuizMLYamlHTMLRenderer(eq_dict, assets=bool(opts.get("assets"))) as renderer:
         html_result = renderer.render(doc)
 
     return html_result
 
 
-def inline_css(html_content, opts):
-    if "html_css" in opts:
-        css = opts["html_css"]
-        # remove all comments (/*COMMENT */) from string
-        css = re.sub(re.compile(r"/\*.*?\*/", re.DOTALL), "", css)
-    else:
-        css = """
+DEFAULT_CSS = """
         .math.inline {vertical-align:middle}
         pre {
               background:#eee;
@@ -507,13 +719,23 @@ def inline_css(html_content, opts):
         }
         """
 
+
+@functools.lru_cache(maxsize=8)
+def get_css_inliner(css):
+    """returns a CSS inliner for a stylesheet, built once per stylesheet."""
+
+    # remove all comments (/*COMMENT */) from string
+    css = re.sub(re.compile(r"/\*.*?\*/", re.DOTALL), "", css)
     css = css.replace("\n", " ").replace("\t", "  ")
+    return css_inline.CSSInliner(extra_css=css)
+
 
-    html_payload = "<html><head><style>" + css + "</style>" + html_content + "</html>"
-    out = css_inline.inline(html_payload)
-    out = out[26:-15]
+def inline_css(html_content, opts):
+    """inlines the CSS of opts['html_css'] (or the default CSS) into the
+    style attributes of an HTML fragment."""
 
-    return out
+    inliner = get_css_inliner(opts.get("html_css", DEFAULT_CSS))
+    return inliner.inline_fragment(html_content, "")
 
 
 def get_html_dict(combined_doc, md_list, opts):
@@ -527,17 +749,24 @@ def get_html_dict(combined_doc, md_list, opts):
 
     html_result = get_html(combined_doc, opts)
 
+    hashes = {get_hash(txt): txt for txt in md_list}
+    sections = split_sections(html_result, SECTION_HEADING_PATTERN, hashes)
+
+    # the CSS is inlined in the whole document at once, with the section
+    # headings replaced by a container for each entry
+    html_result = "".join(
+        f'<{ENTRY_TAG} data-hash="{h}">{content}</{ENTRY_TAG}>' for h, content in sections.items()
+    )
+    html_result = inline_css(html_result, opts)
+    sections = split_sections(html_result, ENTRY_OPENING_PATTERN, hashes)
+
+    closing_tag = f"</{ENTRY_TAG}>"
     md_dict = {}
-    for _i, txt in enumerate(md_list, start=1):
-        h = get_hash(txt)
-        html_h1 = "<h1>" + h + "</h1>"
-        start = html_result.find(html_h1) + len(html_h1)
-        end = html_result.find("<h1>", start + 1)
-        if end == -1:
-            end = len(html_result)
-
-        html_content = html_result[start:end]
-        html_content = inline_css(html_content, opts)
-        html_content = strip_newlines_and_tabs(html_content)
-        md_dict[txt] = html_content
+    for h, txt in hashes.items():
+        if h not in sections:
+            raise MarkdownError(f"couldn't find the section of entry:\n{txt}")
+        content = sections[h]
+        if content.endswith(closing_tag):
+            content = content[: -len(closing_tag)]
+        md_dict[txt] = strip_newlines_and_tabs(content.strip("\n"))
     return md_dict
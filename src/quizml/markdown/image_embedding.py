@@ -1,46 +1,161 @@
 import base64
+import hashlib
+import logging
 import os
 import re
 import struct
+import subprocess
 import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
 from pathlib import Path
-from subprocess import call
 
 from PIL import Image
 
-from ..exceptions import MarkdownImageError
+from ..cache import compute_hash, get_blob, get_from_cache, put_blob, save_to_cache
+from ..exceptions import LatexToolError, MarkdownImageError
+from .latextools import find_tool
 
+# resolution (in dpi) of the PNG conversion of PDF figures
+PDF_RESOLUTION = 250
+
+# bump to invalidate the cached image embeddings
+IMAGE_CACHE_VERSION = 1
+
+# bump to invalidate the cached PNG conversions of PDF figures
+PDF_CACHE_VERSION = 1
+
+# in-process memo of the embedded images:
+# absolute path => (size, mtime_ns, (w, h, data64))
+_image_memo = {}
 
-def embed_pdf(pdf_filename):
-    """returns a base64 string of a PDF file. The PDF is first converted to
-    a PNG file using ghostscript (gs).
-    """
 
-    pdf_abspath = os.path.abspath(pdf_filename)
-    tmpdir = tempfile.mkdtemp()
-    olddir = os.getcwd()
-    os.chdir(tmpdir)
+def rasterize_pdf(pdf_filename, png_filename, resolution=PDF_RESOLUTION):
+    """converts the first page of a PDF file into a PNG file using
+    ghostscript (gs).
 
-    call(
+    The PNG is written to an explicit path, without changing the working
+    directory, so that several PDFs can be converted concurrently.
+    """
+
+    result = subprocess.run(
         [
-            "gs",
+            find_tool("gs"),
             "-dBATCH",
             "-q",
             "-dNOPAUSE",
+            "-dFirstPage=1",
+            "-dLastPage=1",
             "-sDEVICE=pngalpha",
-            "-r250",
+            f"-r{resolution}",
             "-dTextAlphaBits=4",
             "-dGraphicsAlphaBits=4",
-            "-sOutputFile=pngfile.png",
-            pdf_abspath,
-        ]
+            f"-sOutputFile={png_filename}",
+            os.path.abspath(pdf_filename),
+        ],
+        capture_output=True,
+        text=True,
     )
+    if result.returncode != 0 or not os.path.exists(png_filename):
+        raise MarkdownImageError(
+            f"cannot convert {pdf_filename} to PNG with gs:\n{result.stdout}{result.stderr}"
+        )
 
-    # converting into base64 strings
-    [w, h, data64] = embed_base64("pngfile.png")
-    os.chdir(olddir)
-    return (w, h, data64)
+
+def get_pdf_png(pdf_filename, resolution=PDF_RESOLUTION):
+    """returns the PNG conversion (bytes) of a PDF file.
+
+    The PNGs are stored as binary entries of the cache, keyed by the
+    content of the PDF and the resolution, so that each PDF is only
+    converted once.
+    """
+
+    try:
+        pdf_data = Path(pdf_filename).read_bytes()
+    except OSError as err:
+        raise MarkdownImageError(f"cannot read image {pdf_filename}") from err
+
+    key = compute_hash(
+        hashlib.sha256(pdf_data).hexdigest(), f"{PDF_CACHE_VERSION}\0pdf-png\0{resolution}"
+    )
+    png_data = get_blob(key)
+    if png_data is not None:
+        return png_data
+
+    with tempfile.TemporaryDirectory(prefix="quizml_pdf_") as tmpdir:
+        tmp_png = Path(tmpdir) / "figure.png"
+        rasterize_pdf(pdf_filename, tmp_png, resolution)
+        png_data = tmp_png.read_bytes()
+    put_blob(key, png_data)
+    return png_data
+
+
+def rasterize_many(pdf_filenames, jobs=None):
+    """converts several PDF files into PNGs concurrently (see get_pdf_png).
+
+    Returns:
+        a dictionary mapping each PDF filename to its PNG (bytes). PDFs
+        that fail to convert are left out (the error is raised again when
+        the PDF is embedded).
+    """
+
+    pdf_filenames = list(dict.fromkeys(pdf_filenames))
+    if not pdf_filenames:
+        return {}
+
+    def convert(pdf_filename):
+        try:
+            return get_pdf_png(pdf_filename)
+        except (MarkdownImageError, LatexToolError) as err:
+            logging.debug(f"[pdf] {err}")
+            return None
+
+    with ThreadPoolExecutor(max_workers=jobs, thread_name_prefix="quizml_pdf") as pool:
+        pngs = pool.map(convert, pdf_filenames)
+
+    return {pdf: png for pdf, png in zip(pdf_filenames, pngs) if png is not None}
+
+
+def embed_pdf(pdf_filename):
+    """returns a base64 string of a PDF file. The PDF is first converted to
+    a PNG using ghostscript (gs), see get_pdf_png.
+    """
+
+    return embed_data(get_pdf_png(pdf_filename), "png")
+
+
+def embed_image(pathname):
+    """returns the (width, height, base64 string) of an image file, as
+    embed_base64 does, but memoized.
+
+    The embeddings are memoized in-process and in the persistent cache,
+    keyed by the absolute path, size and mtime of the file, so that
+    repeated images and rebuilds do not read, decode or convert the
+    image again.
+    """
+
+    abspath = os.path.abspath(pathname)
+    try:
+        st = os.stat(abspath)
+    except OSError as err:
+        raise MarkdownImageError(f"cannot read image {pathname}") from err
+
+    memo = _image_memo.get(abspath)
+    if memo is not None and memo[:2] == (st.st_size, st.st_mtime_ns):
+        return memo[2]
+
+    key = compute_hash(
+        f"{IMAGE_CACHE_VERSION}\0{abspath}\0{st.st_size}\0{st.st_mtime_ns}", "image"
+    )
+    cached = get_from_cache(key)
+    if cached is not None:
+        embedding = tuple(cached)
+    else:
+        embedding = embed_base64(pathname)
+        save_to_cache(key, list(embedding))
+
+    _image_memo[abspath] = (st.st_size, st.st_mtime_ns, embedding)
+    return embedding
 
 
 def embed_base64(pathname):
@@ -67,6 +182,13 @@ def embed_base64(pathname):
     except FileNotFoundError as err:
         raise MarkdownImageError(f"cannot read image {pathname}") from err
 
+    return embed_data(data, ext)
+
+
+def embed_data(data, ext):
+    """returns the (width, height, base64 string) of the content of an
+    image file, of MIME subtype ext (eg. 'png')."""
+
     if ext == "svg+xml":
         [w, h] = get_SVG_info(data.decode())
     else:
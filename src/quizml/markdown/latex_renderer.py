@@ -1,5 +1,6 @@
 import logging
 import os
+import re
 import shutil
 import subprocess
 
@@ -8,7 +9,10 @@ from mistletoe.latex_renderer import LaTeXRenderer
 
 from ..exceptions import MarkdownError
 from .extensions import ImageWithWidth, MathDisplay, MathInline
-from .utils import get_hash
+from .utils import get_hash, split_sections
+
+# the heading of each entry section of the combined document
+SECTION_HEADING_PATTERN = re.compile(r"\\section\*?\{([0-9a-f]{32})\}")
 
 
 def convert_svg_to_pdf(svg_path, pdf_path):
@@ -142,25 +146,19 @@ def get_latex_dict(combined_doc, md_list):
 
     latex_result = get_latex(combined_doc)
 
+    hashes = {get_hash(txt): txt for txt in md_list}
+    sections = split_sections(latex_result, SECTION_HEADING_PATTERN, hashes)
+
     md_dict = {}
 
-    for txt in md_list:
-        h = get_hash(txt)
-        latex_section = "\\section{" + h + "}"
-        start = latex_result.find(latex_section)
-        if start < 0:
+    for h, txt in hashes.items():
+        if h not in sections:
             logging.error(
                 "couldn't find hash in md_list. This shouldn't happen."
                 + "I'm quitting.\n"
             )
             raise MarkdownError("couldn't find hash in md_list")
-        else:
-            start = latex_result.find("}\n", start) + 1
-        end = latex_result.find("\\section{", start + 1)
-        if end == -1:
-            end = len(latex_result)
-        latex_content = latex_result[start:end].strip()
-
-        md_dict[txt] = latex_content
+
+        md_dict[txt] = sections[h].strip()
 
     return md_dict
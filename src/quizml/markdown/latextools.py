@@ -1,42 +1,234 @@
+import atexit
+import functools
+import hashlib
+import logging
+import os
 import shutil
 import subprocess
 import tempfile
+import threading
 from pathlib import Path
 
+from ..cache import get_cache_dir
 from ..exceptions import (
     DvisvgmNotFoundError,
     GhostscriptNotFoundError,
     LatexCompilationError,
     LatexNotFoundError,
+    LatexToolError,
     Make4htNotFoundError,
 )
 
+# name under which precompiled preamble formats are loaded
+FORMAT_NAME = "quizmlfmt"
+
+# external tools, and the error raised when they are missing
+TOOLS = {
+    "pdflatex": LatexNotFoundError,
+    "gs": GhostscriptNotFoundError,
+    "latex": LatexNotFoundError,
+    "dvisvgm": DvisvgmNotFoundError,
+    "make4ht": Make4htNotFoundError,
+}
+
+_tool_paths = {}
+
+
+def set_tool_paths(tool_paths):
+    """sets the paths of the external tools (`tool_paths` in the config
+    file), eg. {'gs': '/opt/homebrew/bin/gs'}. Tools that are not listed
+    are looked up in the PATH. The memoized lookups are only reset if the
+    paths have changed."""
+
+    tool_paths = dict(tool_paths or {})
+    if tool_paths == _tool_paths:
+        return
+    _tool_paths.clear()
+    _tool_paths.update(tool_paths)
+    find_tool.cache_clear()
+    get_tool_info.cache_clear()
+
+
+@functools.cache
+def find_tool(name):
+    """returns the full path of an external tool.
+
+    Tools are only looked up when a backend first needs them, and the
+    result is memoized for the process.
+
+    Raises:
+        LatexToolError: (or the subclass listed in TOOLS) if the tool
+        cannot be found.
+    """
+
+    configured = _tool_paths.get(name)
+    path = shutil.which(os.path.expanduser(configured or name))
+    if not path:
+        where = f"at {configured}" if configured else "in PATH"
+        raise TOOLS.get(name, LatexToolError)(f"{name} not found {where}.")
+    return path
+
+
+@functools.lru_cache(maxsize=1)
+def get_tool_info():
+    """probes the external tools once, and returns, for each of them, its
+    path and version (the first line of `tool --version`), or None if
+    the tool cannot be found."""
+
+    info = {}
+    for name in TOOLS:
+        try:
+            path = find_tool(name)
+        except LatexToolError:
+            info[name] = {"path": None, "version": None}
+            continue
+
+        try:
+            process = subprocess.run(
+                [path, "--version"],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                text=True,
+                timeout=10,
+            )
+            lines = [line.strip() for line in process.stdout.splitlines() if line.strip()]
+            version = lines[0] if lines else None
+        except (OSError, subprocess.SubprocessError):
+            version = None
+
+        info[name] = {"path": path, "version": version}
+
+    return info
+
+
+_format_lock = threading.Lock()
+_format_files = {}
+
+
+def get_format_file(engine, preamble):
+    """returns a precompiled format file for a LaTeX preamble.
+
+    The preamble (everything up to `\\begin{document}`) is dumped into a
+    format file with mylatexformat, so that equation runs can skip parsing
+    the preamble and loading its packages. Format files are stored in the
+    quizml cache dir, keyed by the preamble, engine and engine version.
+
+    Args:
+        engine: 'latex' or 'pdflatex'
+        preamble: the LaTeX source up to and including `\\begin{document}`
+
+    Returns:
+        the path to the format file, or None if it could not be built
+        (eg. mylatexformat is not installed).
+    """
+
+    try:
+        engine_path = find_tool(engine)
+    except LatexToolError:
+        return None
+
+    m = hashlib.sha256()
+    m.update(preamble.encode("utf-8"))
+    m.update(f"{engine_path}:{os.stat(engine_path).st_mtime_ns}".encode())
+    fmt_key = f"{engine}-{m.hexdigest()[:32]}"
+
+    with _format_lock:
+        if fmt_key in _format_files:
+            return _format_files[fmt_key]
+
+        fmt_path = get_cache_dir() / "formats" / f"{fmt_key}.fmt"
+        if not fmt_path.exists() and not _build_format_file(
+            engine_path, preamble, fmt_path
+        ):
+            fmt_path = None
+
+        _format_files[fmt_key] = fmt_path
+        return fmt_path
+
+
+def _build_format_file(engine_path, preamble, fmt_path):
+    engine = Path(engine_path).name
+    with tempfile.TemporaryDirectory(prefix="quizml_fmt_") as tmpdir:
+        Path(tmpdir, "preamble.tex").write_text(preamble + "\n\\end{document}\n")
+        process = subprocess.run(
+            [
+                engine_path,
+                "-ini",
+                "-interaction=nonstopmode",
+                f"-jobname={FORMAT_NAME}",
+                f"&{engine}",
+                "mylatexformat.ltx",
+                "preamble.tex",
+            ],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            cwd=tmpdir,
+        )
+
+        built_fmt = Path(tmpdir, f"{FORMAT_NAME}.fmt")
+        if process.returncode != 0 or not built_fmt.exists():
+            logging.info(
+                f"could not precompile the {engine} preamble, "
+                "compiling equations without format file"
+            )
+            logging.debug(process.stdout)
+            return False
+
+        fmt_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = fmt_path.with_suffix(f".{os.getpid()}.tmp")
+        shutil.copyfile(built_fmt, tmp_path)
+        os.replace(tmp_path, fmt_path)
+
+    logging.info(f"precompiled {engine} preamble into {fmt_path}")
+    return True
+
 
 class LatexRunner:
+    """Runs the external LaTeX tools in a temporary directory.
+
+    Each tool is only looked up (see find_tool) when it is first run, so
+    that a backend does not require the tools of the other backends.
+    """
+
     def __init__(self, working_dir_prefix="quizml_latex_"):
-        self._check_executables()
         self.temp_dir = Path(tempfile.mkdtemp(prefix=working_dir_prefix))
 
-    def _check_executables(self):
-        if not shutil.which("pdflatex"):
-            raise LatexNotFoundError("pdflatex not found in PATH.")
-        if not shutil.which("gs"):
-            raise GhostscriptNotFoundError("gs (Ghostscript) not found in PATH.")
-        if not shutil.which("latex"):
-            raise LatexNotFoundError("latex not found in PATH.")
-        if not shutil.which("dvisvgm"):
-            raise DvisvgmNotFoundError("dvisvgm not found in PATH.")
-        if not shutil.which("make4ht"):
-            raise Make4htNotFoundError("make4ht not found in PATH.")
-
-    def run_pdflatex(self, latex_content: str):
-        latex_filename = self.temp_dir / "eq_list.tex"
-        pdf_filename = self.temp_dir / "eq_list.pdf"
+    def _format_args(self, engine, preamble):
+        """returns the command line arguments to start `engine` from the
+        precompiled format of the preamble (if available)."""
+
+        if preamble is None:
+            return []
+
+        fmt_path = get_format_file(engine, preamble)
+        if fmt_path is None:
+            return []
+
+        local_fmt = self.temp_dir / f"{FORMAT_NAME}.fmt"
+        try:
+            local_fmt.symlink_to(fmt_path)
+        except OSError:
+            shutil.copyfile(fmt_path, local_fmt)
+        return [f"-fmt={FORMAT_NAME}"]
 
+    def _run_engine(self, engine, latex_content, preamble=None):
+        """runs `engine` on latex_content, in the temp dir, with eq_list as
+        jobname.
+
+        Returns:
+            the return code and the terminal output of the run.
+        """
+        latex_filename = self.temp_dir / "eq_list.tex"
         latex_filename.write_text(latex_content)
 
         process = subprocess.Popen(
-            ["pdflatex", "-interaction=nonstopmode", str(latex_filename)],
+            [
+                find_tool(engine),
+                *self._format_args(engine, preamble),
+                "-interaction=nonstopmode",
+                str(latex_filename),
+            ],
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             universal_newlines=True,
@@ -44,10 +236,21 @@ class LatexRunner:
         )
 
         stdout, _ = process.communicate()
+        return process.returncode, stdout
 
-        if process.returncode != 0:
+    def run_pdflatex(self, latex_content: str, preamble=None):
+        """compiles latex_content with pdflatex.
+
+        If the preamble of latex_content is given, it is precompiled into
+        a format file (see get_format_file) to speed up the run.
+        """
+        pdf_filename = self.temp_dir / "eq_list.pdf"
+
+        returncode, stdout = self._run_engine("pdflatex", latex_content, preamble)
+
+        if returncode != 0:
             raise LatexCompilationError(
-                f"pdflatex failed with return code {process.returncode}\n\n{stdout}"
+                f"pdflatex failed with return code {returncode}\n\n{stdout}"
             )
 
         # Parse depth ratio from stdout
@@ -72,7 +275,7 @@ class LatexRunner:
 
         subprocess.check_call(
             [
-                "gs",
+                find_tool("gs"),
                 "-dBATCH",
                 "-q",
                 "-dNOPAUSE",
@@ -89,25 +292,19 @@ class LatexRunner:
         # Return a list of generated PNG files
         return sorted(self.temp_dir.glob(f"{output_prefix}*.png"))
 
-    def run_latex_dvi(self, latex_content: str):
-        latex_filename = self.temp_dir / "eq_list.tex"
-        dvi_filename = self.temp_dir / "eq_list.dvi"
-
-        latex_filename.write_text(latex_content)
+    def run_latex_dvi(self, latex_content: str, preamble=None):
+        """compiles latex_content into a DVI file with latex.
 
-        process = subprocess.Popen(
-            ["latex", "-interaction=nonstopmode", str(latex_filename)],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            universal_newlines=True,
-            cwd=self.temp_dir,
-        )
+        If the preamble of latex_content is given, it is precompiled into
+        a format file (see get_format_file) to speed up the run.
+        """
+        dvi_filename = self.temp_dir / "eq_list.dvi"
 
-        stdout, _ = process.communicate()
+        returncode, stdout = self._run_engine("latex", latex_content, preamble)
 
-        if process.returncode != 0:
+        if returncode != 0:
             raise LatexCompilationError(
-                f"latex failed with return code {process.returncode}\n\n{stdout}"
+                f"latex failed with return code {returncode}\n\n{stdout}"
             )
 
         err_msg = ""
@@ -128,7 +325,7 @@ class LatexRunner:
 
         subprocess.check_call(
             [
-                "dvisvgm",
+                find_tool("dvisvgm"),
                 "-n",
                 "-v",
                 "1",
@@ -151,7 +348,7 @@ class LatexRunner:
         latex_filename.write_text(latex_content)
 
         process = subprocess.Popen(
-            ["make4ht", "-x", str(latex_filename), "xhtml,html5,mathml"],
+            [find_tool("make4ht"), "-x", str(latex_filename), "xhtml,html5,mathml"],
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
             universal_newlines=True,
@@ -177,3 +374,150 @@ class LatexRunner:
 
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.cleanup()
+
+
+class LatexWorker(LatexRunner):
+    """A LatexRunner whose TeX process is started ahead of time.
+
+    The worker starts `engine` on a driver file made of the preamble,
+    followed by a `\\read` from the terminal, so that the preamble (and
+    its packages and fonts) are loaded while the worker waits for work.
+
+    The equations are then passed over stdin: the body of the document is
+    written to `batch.tex` and the worker is sent the line
+    `\\input{batch.tex}`. The body ends with `\\end{document}`, so the
+    worker exits when the batch is compiled, which closes the output file
+    for dvisvgm/gs. Each worker can thus only be used once.
+    """
+
+    def __init__(self, engine, preamble):
+        engine_path = find_tool(engine)
+        super().__init__(working_dir_prefix="quizml_worker_")
+        self.engine = engine
+        self.preamble = preamble
+
+        driver = preamble + "\\read16 to \\quizmlbatch\n\\quizmlbatch\n"
+        (self.temp_dir / "worker.tex").write_text(driver)
+
+        self.process = subprocess.Popen(
+            [
+                engine_path,
+                *self._format_args(engine, preamble),
+                "-interaction=scrollmode",
+                "-jobname=eq_list",
+                "worker.tex",
+            ],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            universal_newlines=True,
+            cwd=self.temp_dir,
+        )
+
+    def is_alive(self):
+        return self.process.poll() is None
+
+    def _run_engine(self, engine, latex_content, preamble=None):
+        if (
+            engine != self.engine
+            or preamble != self.preamble
+            or not self.is_alive()
+            or not latex_content.startswith(self.preamble)
+        ):
+            return super()._run_engine(engine, latex_content, preamble)
+
+        (self.temp_dir / "batch.tex").write_text(latex_content[len(self.preamble) :])
+        stdout, _ = self.process.communicate(input="\\input{batch.tex}\n")
+        return self.process.returncode, stdout
+
+    def cleanup(self):
+        if self.is_alive():
+            self.process.kill()
+            self.process.communicate()
+        super().cleanup()
+
+
+class LatexWorkerPool:
+    """Keeps warm LatexWorkers for each (engine, preamble), one per
+    parallel slot (ie. per concurrent equation shard).
+
+    Taking a worker starts its replacement, so that the other shards, the
+    bisection batches and the next rebuild (eg. in watch mode) find
+    workers that have already loaded their preamble. The workers of a
+    preamble that is no longer used (eg. after an edit of the preamble)
+    are retired.
+    """
+
+    def __init__(self, slots=None):
+        self.slots = int(slots or os.cpu_count() or 1)
+        self._workers = {}
+        self._lock = threading.Lock()
+
+    def take(self, engine, preamble):
+        """returns a warm worker for that preamble, or None if there
+        wasn't any (in which case some are started for next time)."""
+
+        key = (engine, preamble)
+        retired = []
+        with self._lock:
+            for other_key in [k for k in self._workers if k[0] == engine and k != key]:
+                retired += self._workers.pop(other_key)
+
+            workers = self._workers.setdefault(key, [])
+            worker = None
+            while workers and worker is None:
+                worker = workers.pop()
+                if not worker.is_alive():
+                    retired.append(worker)
+                    worker = None
+
+            try:
+                while len(workers) < self.slots:
+                    workers.append(LatexWorker(engine, preamble))
+            except LatexToolError as err:
+                logging.debug(f"could not start LaTeX worker: {err}")
+
+        for old_worker in retired:
+            old_worker.cleanup()
+        return worker
+
+    def close(self):
+        with self._lock:
+            for workers in self._workers.values():
+                for worker in workers:
+                    worker.cleanup()
+            self._workers.clear()
+
+
+_worker_pool = None
+
+
+def start_worker_pool(jobs=None):
+    """keeps warm LaTeX workers for the equation builds (used in watch
+    mode), one per parallel job."""
+    global _worker_pool
+    if _worker_pool is None:
+        _worker_pool = LatexWorkerPool(jobs)
+        atexit.register(stop_worker_pool)
+
+
+def stop_worker_pool():
+    """stops all the warm LaTeX workers."""
+    global _worker_pool
+    if _worker_pool is not None:
+        _worker_pool.close()
+        _worker_pool = None
+
+
+def take_warm_worker(engine, preamble):
+    """returns a warm LatexWorker for that preamble if the worker pool is
+    running, and None otherwise.
+
+    The worker is used in place of a LatexRunner:
+
+        with take_warm_worker("latex", preamble) or LatexRunner() as runner:
+            runner.run_latex_dvi(preamble + body, preamble=preamble)
+    """
+    if _worker_pool is None:
+        return None
+    return _worker_pool.take(engine, preamble)
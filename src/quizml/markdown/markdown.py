@@ -3,15 +3,32 @@ Markdown classes requried by mistletoe for parsing
 
 """
 
+import json
+import logging
+from importlib.metadata import version
+
 import mistletoe as mt
 from mistletoe import ast_renderer
 
 import quizml.markdown.extensions as mte
-from quizml.utils import get_md_list_from_yaml, transcode_md_in_yaml
-
-from .html_renderer import get_html_dict
+from quizml.cache import compute_hash, get_many, put_many
+from quizml.exceptions import LatexEquationsError
+from quizml.utils import (
+    MarkdownString,
+    get_md_list_from_yaml,
+    iter_nodes,
+    transcode_md_in_yaml,
+)
+
+from .assets import externalize_dict, get_assets_dir
+from .html_renderer import get_eq_sources, get_html_dict
 from .latex_renderer import get_latex_dict
-from .utils import md_combine_list
+from .utils import get_hash, get_image_paths, get_image_signature, md_combine_list
+
+# bump to invalidate the cached renders of MD entries when the renderers
+# change
+ENTRY_CACHE_VERSION = 1
+
 
 """
  MarkdownTranscoder 
@@ -37,21 +54,46 @@ from .utils import md_combine_list
 """
 
 
+# the target options that the render of each format depends on
+FMT_OPTIONS = {
+    "html": ["html_pre", "html_css", "user_pre", "assets"],
+    "latex": [],
+}
+
+
+def get_opts_fingerprint(opts):
+    """returns a hash of the target options that the Markdown render
+    depends on. Targets with the same fingerprint share their renders.
+
+    Missing and empty options are equivalent, and options that have no
+    effect on the format (eg. 'html_css' for 'latex', or 'template') are
+    ignored.
+    """
+
+    fmt = opts.get("fmt", "")
+    keys = FMT_OPTIONS["html"] if fmt.startswith("html") else FMT_OPTIONS.get(fmt, [])
+    relevant = {key: opts.get(key) or "" for key in keys}
+    if relevant.get("assets"):
+        # the renders reference the assets directory of the output
+        relevant["assets"] = str(get_assets_dir(opts.get("out", "")))
+    return compute_hash(json.dumps([fmt, relevant], sort_keys=True))
+
+
 class MarkdownTranscoder:
     def __init__(self, yaml_data, schema=None):
         self.yaml_data = yaml_data
         self.schema = schema
 
-        # the dictionary of rendered entries will be cached
+        # the dictionary of rendered entries, and the transcoded YAML
+        # struct, are cached for each set of format options
         self.cache_dict = {}
+        self.tree_cache = {}
 
         # read yaml_data and collect all MD entries into a single list
         self.md_list = get_md_list_from_yaml(yaml_data, schema)
 
-        # combine this into a single MD string,
-        # with entries separated by sections
-        md_combined = md_combine_list(self.md_list)
-        
+        self._doc_combined = None
+
         if not self.md_list:
             return
 
@@ -66,7 +108,70 @@ class MarkdownTranscoder:
         mt.span_token.add_token(mte.ImageWithWidth)
         self.renderer = ast_renderer.AstRenderer()
 
-        self.doc_combined = mt.Document(md_combined)
+    def parse(self, md_list):
+        """Parses a list of MD entries into a single mistletoe document,
+        with entries separated by sections"""
+
+        return mt.Document(md_combine_list(md_list))
+
+    @property
+    def doc_combined(self):
+        """The mistletoe document of all the MD entries (parsed on first
+        use only, as renders are served from the entry cache)"""
+
+        if self._doc_combined is None:
+            self._doc_combined = self.parse(self.md_list)
+        return self._doc_combined
+
+    def cached_entry_dict(self, settings, render_dict):
+        """Returns the dictionary of the renders of all MD entries.
+
+        Renders are cached per entry in the persistent cache, keyed by the
+        entry, the render settings and the images it references. Only the
+        entries missing from the cache are parsed and rendered.
+
+        Args:
+            settings (str): the render settings (format, preamble, CSS, ...)
+            render_dict: function (doc, md_list) -> dictionary of renders
+
+        Returns:
+            a dictionary where each key corresponds to the MD string
+            and the value is its render
+        """
+
+        settings_hash = compute_hash(
+            f"{ENTRY_CACHE_VERSION}\0{version('quizml')}\0{settings}"
+        )
+        keys = {
+            md: compute_hash(md, settings_hash + get_image_signature(md))
+            for md in self.md_list
+        }
+        cached = get_many(keys.values())
+
+        d = {md: cached[key] for md, key in keys.items() if key in cached}
+        missing = [md for md in self.md_list if md not in d]
+        if not missing:
+            return d
+
+        logging.info(f"rendering {len(missing)}/{len(self.md_list)} Markdown entries")
+
+        if len(missing) == len(self.md_list):
+            doc = self.doc_combined
+        else:
+            doc = self.parse(missing)
+
+        rendered = render_dict(doc, missing)
+        put_many({keys[md]: rendered[md] for md in missing})
+        d.update(rendered)
+        return d
+
+    def get_image_paths(self):
+        """Returns the paths of all the images referenced in the MD entries"""
+
+        paths = []
+        for md in self.md_list:
+            paths += get_image_paths(md)
+        return list(dict.fromkeys(paths))
 
     def html_dict(self, opts=None):
         """Returns a HTML dictionary of all MD entries in the YAML data
@@ -75,7 +180,9 @@ class MarkdownTranscoder:
             the rendered HTML dictionary is cached
 
         Args:
-            opts (:dict): passing optional val for 'html_pre' and 'html_css'
+            opts (:dict): passing optional val for 'html_pre', 'html_css'
+                and 'assets' (images are written into the assets
+                directory of opts['out'] instead of being embedded)
 
         Returns:
             a dictionary where each key corresponds to the MD string
@@ -87,15 +194,55 @@ class MarkdownTranscoder:
         if opts is None:
             opts = {}
             
-        html_pre = opts.get("html_pre", "")
-        html_css = opts.get("html_css", "")
-        key = opts["fmt"] + ":PRE:" + html_pre + "CSS:" + html_css
+        key = get_opts_fingerprint(opts)
         if key in self.cache_dict:
             return self.cache_dict[key]
-        d = get_html_dict(self.doc_combined, self.md_list, opts)
+
+        def render_dict(doc, md_list):
+            try:
+                return get_html_dict(doc, md_list, opts)
+            except LatexEquationsError as err:
+                raise self.locate_eq_errors(err, doc) from err
+
+        d = self.cached_entry_dict(key, render_dict)
+        if opts.get("assets"):
+            d = externalize_dict(d, get_assets_dir(opts.get("out", "")))
         self.cache_dict[key] = d
         return d
 
+    def locate_eq_errors(self, err, doc=None):
+        """Returns a copy of a LatexEquationsError where each failed
+        equation is reported with the question it comes from.
+
+        Args:
+            err (LatexEquationsError): the error raised by the equation build
+            doc: the mistletoe document that was rendered (defaults to
+                the document of all the MD entries)
+
+        Returns:
+            a LatexEquationsError with a more informative message
+        """
+
+        # maps each MD entry to its question number
+        md_questions = {}
+        for i, question in enumerate(self.yaml_data.get("questions", []), start=1):
+            for node in iter_nodes(question):
+                if isinstance(node, MarkdownString):
+                    md_questions.setdefault(str(node), f"Q{i}")
+
+        md_from_hash = {get_hash(md): md for md in self.md_list}
+        eq_sources = get_eq_sources(doc if doc is not None else self.doc_combined)
+
+        msg = f"{len(err.failures)} equation(s) failed to compile:\n"
+        for eq, eq_err in err.failures:
+            md = md_from_hash.get(eq_sources.get(eq), "")
+            where = md_questions.get(md, "header")
+            lines = md.strip().splitlines()
+            excerpt = (lines[0] if lines else "") + (" […]" if len(lines) > 1 else "")
+            msg += f"\n[{where}] {eq}\n  in: {excerpt}\n{eq_err}\n"
+
+        return LatexEquationsError(err.failures, msg)
+
     def latex_dict(self, opts=None):
         """Returns a LaTeX dictionary of all MD entries in the YAML data
 
@@ -114,10 +261,10 @@ class MarkdownTranscoder:
         if opts is None:
             opts = {}
         
-        key = opts["fmt"]
+        key = get_opts_fingerprint(opts)
         if key in self.cache_dict:
             return self.cache_dict[key]
-        d = get_latex_dict(self.doc_combined, self.md_list)
+        d = self.cached_entry_dict(key, get_latex_dict)
         self.cache_dict[key] = d
         return d
 
@@ -175,8 +322,16 @@ class MarkdownTranscoder:
         if not self.md_list:
             return self.yaml_data
 
-        target_dict = self.get_dict(opts=target)
-        return transcode_md_in_yaml(self.yaml_data, target_dict, self.schema)
+        # targets with the same format options (eg. 'latex' and
+        # 'latex-solutions') share the same transcoded struct, which
+        # templates must thus not modify
+        key = get_opts_fingerprint(target)
+        if key not in self.tree_cache:
+            target_dict = self.get_dict(opts=target)
+            self.tree_cache[key] = transcode_md_in_yaml(
+                self.yaml_data, target_dict, self.schema
+            )
+        return self.tree_cache[key]
 
 
 def print_doc(doc, lead=""):
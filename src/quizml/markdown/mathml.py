@@ -0,0 +1,135 @@
+"""In-process conversion of LaTeX equations into MathML.
+
+This is used by the `html-mathml-fast` format. Equations are converted
+with latex2mathml, without any TeX installation. latex2mathml only
+supports a subset of LaTeX, so equations are only converted if all
+their macros and environments are in the whitelists below; the other
+equations are left to make4ht (see build_eq_dict_MathML_fast).
+
+Typical usage example:
+
+    mathml = latex_to_mathml("$\\frac{a}{b}$")
+    if mathml is None:
+        ...  # not supported, use make4ht instead
+
+"""
+
+import logging
+import re
+
+from latex2mathml.converter import convert
+
+# macros that latex2mathml converts faithfully
+SUPPORTED_MACROS = frozenset(
+    # greek letters
+    """
+    alpha beta gamma delta epsilon varepsilon zeta eta theta vartheta iota
+    kappa lambda mu nu xi pi varpi rho varrho sigma varsigma tau upsilon
+    phi varphi chi psi omega Gamma Delta Theta Lambda Xi Pi Sigma Upsilon
+    Phi Psi Omega
+    """.split()
+    # fractions, roots, scripts and accents
+    + """
+    frac dfrac tfrac cfrac binom dbinom tbinom sqrt overline underline
+    overbrace underbrace hat widehat bar tilde widetilde vec dot ddot
+    acute grave breve check prime
+    """.split()
+    # big operators and functions
+    + """
+    sum prod coprod int iint iiint oint bigcup bigcap bigoplus bigotimes
+    lim limsup liminf sup inf max min det exp log ln lg sin cos tan cot sec
+    csc arcsin arccos arctan sinh cosh tanh coth gcd deg dim ker hom Pr
+    operatorname
+    """.split()
+    # binary operators and relations
+    + """
+    pm mp times div cdot ast star circ bullet oplus ominus otimes oslash
+    odot cup cap setminus wedge vee land lor neg lnot leq le geq ge neq ne
+    approx sim simeq cong equiv propto ll gg subset supset subseteq
+    supseteq in notin ni mid parallel perp forall exists nexists partial
+    nabla infty emptyset varnothing to gets mapsto implies iff
+    rightarrow leftarrow leftrightarrow Rightarrow Leftarrow
+    Leftrightarrow longrightarrow longleftarrow uparrow downarrow
+    """.split()
+    # delimiters and dots
+    + """
+    left right big Big bigg Bigg langle rangle lfloor rfloor lceil rceil
+    lvert rvert lVert rVert vert Vert ldots cdots vdots ddots dots
+    """.split()
+    # fonts, text and spacing
+    + """
+    mathbf mathrm mathit mathsf mathtt mathcal mathbb mathfrak boldsymbol
+    bm text textbf textit mbox quad qquad displaystyle textstyle
+    """.split()
+    # environments and alignment
+    + ["begin", "end"]
+)
+
+# environments that latex2mathml converts faithfully
+SUPPORTED_ENVIRONMENTS = frozenset(
+    """
+    matrix pmatrix bmatrix Bmatrix vmatrix Vmatrix smallmatrix cases align
+    align*
+    """.split()
+)
+
+MACRO_PATTERN = re.compile(r"\\([a-zA-Z]+)")
+ENVIRONMENT_PATTERN = re.compile(r"\\begin\{([a-zA-Z*]+)\}")
+
+# the delimiters of the equations, and whether they are displayed
+DELIMITERS = [
+    (re.compile(r"^\$\$(.*)\$\$$", re.DOTALL), "block"),
+    (re.compile(r"^\\\[(.*)\\\]$", re.DOTALL), "block"),
+    (re.compile(r"^\\begin\{(?:equation\*?)\}(.*)\\end\{equation\*?\}$", re.DOTALL), "block"),
+    (re.compile(r"^(\\begin\{(align\*?)\}.*\\end\{\2\})$", re.DOTALL), "block"),
+    (re.compile(r"^\$(.*)\$$", re.DOTALL), "inline"),
+    (re.compile(r"^\\\((.*)\\\)$", re.DOTALL), "inline"),
+]
+
+
+def strip_delimiters(eq):
+    """returns the LaTeX content of an equation (eg. `$x^2$`), and its
+    display mode ('inline' or 'block'), or None if the delimiters are
+    not supported."""
+
+    eq = eq.strip()
+    for pattern, display in DELIMITERS:
+        m = pattern.match(eq)
+        if m:
+            return m.group(1), display
+    return None
+
+
+def is_supported(latex):
+    """True if all the macros and environments of the LaTeX equation are
+    in the whitelists."""
+
+    macros = set(MACRO_PATTERN.findall(latex))
+    if not macros <= SUPPORTED_MACROS:
+        logging.debug(f"[mathml] unsupported macros: {macros - SUPPORTED_MACROS}")
+        return False
+
+    environments = set(ENVIRONMENT_PATTERN.findall(latex))
+    return environments <= SUPPORTED_ENVIRONMENTS
+
+
+def latex_to_mathml(eq):
+    """converts a LaTeX equation, with its delimiters, into MathML.
+
+    Returns:
+        the MathML string, or None if the equation is not supported.
+    """
+
+    stripped = strip_delimiters(eq)
+    if stripped is None:
+        return None
+
+    latex, display = stripped
+    if not is_supported(latex):
+        return None
+
+    try:
+        return convert(latex, display=display)
+    except Exception as err:
+        logging.debug(f"[mathml] latex2mathml failed on {eq}: {err}")
+        return None
@@ -1,4 +1,9 @@
 import hashlib
+import os
+import re
+
+# Markdown images, ie. ![title](src) or ![title](src){width=...}
+IMAGE_PATTERN = re.compile(r"!\[[^\]]*\]\(\s*(?:<([^>]*)>|([^)\s]+))")
 
 
 def get_hash(txt):
@@ -30,6 +35,79 @@ def md_combine_list(md_list):
     return txt
 
 
+def split_sections(rendered, heading_pattern, hashes):
+    """
+    splits a rendered document into its sections in a single sweep.
+
+    Parameters
+    ----------
+    rendered : str
+        the render of a document made by md_combine_list
+    heading_pattern : re.Pattern
+        pattern of the rendered section headings, with the hash as
+        first group
+    hashes : set
+        the hashes of the entries (any other heading is kept as part of
+        the section content)
+
+    Returns
+    -------
+    a dictionary that maps each hash to the render of its section
+    """
+
+    sections = {}
+    current, start = None, 0
+    for m in heading_pattern.finditer(rendered):
+        if m.group(1) not in hashes:
+            continue
+        if current is not None:
+            sections[current] = rendered[start : m.start()]
+        current, start = m.group(1), m.end()
+    if current is not None:
+        sections[current] = rendered[start:]
+    return sections
+
+
+def get_image_paths(md_entry):
+    """
+    returns the paths of the images referenced in a markdown entry,
+    without parsing the entry.
+
+    Parameters
+    ----------
+    md_entry : str
+        markdown entry
+    """
+
+    return [m.group(1) or m.group(2) for m in IMAGE_PATTERN.finditer(md_entry)]
+
+
+def get_image_signature(md_entry):
+    """
+    returns a string that changes whenever one of the images referenced
+    in a markdown entry changes (based on file size and mtime). SVG images
+    also depend on their PDF conversion (see latex_renderer).
+
+    Parameters
+    ----------
+    md_entry : str
+        markdown entry
+    """
+
+    signature = ""
+    for path in get_image_paths(md_entry):
+        paths = [path]
+        if path.lower().endswith(".svg"):
+            paths.append(os.path.splitext(path)[0] + ".pdf")
+        for p in paths:
+            try:
+                st = os.stat(p)
+                signature += f"{p}:{st.st_size}:{st.st_mtime_ns};"
+            except OSError:
+                signature += f"{p}:missing;"
+    return signature
+
+
 def append_unique(alist, blist):
     """
     append all elements of blist to alist that are not already in alist.
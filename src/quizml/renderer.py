@@ -1,35 +1,121 @@
+import contextlib
+import functools
+import logging
 import math
+import os
 import pathlib
 
 import jinja2
+import jinja2.meta
 
+import quizml.cli.filelocator as filelocator
+from quizml.cache import get_cache_dir
 from quizml.exceptions import Jinja2SyntaxError
 from quizml.utils import msg_context, text_wrap
 
 
-def render_template(context, template_filename):
-    if not template_filename:
-        msg = "Template filename is missing, can't render jinja."
-        raise Jinja2SyntaxError(msg)
+class TemplateLoader(jinja2.FileSystemLoader):
+    """Loads templates from the quizml search path (see FileLocator).
+
+    Absolute paths (eg. the template paths resolved in the config) are
+    loaded as is. Templates are reloaded whenever their mtime changes.
+    """
+
+    def get_source(self, environment, template):
+        path = os.path.expanduser(template)
+        if not os.path.isabs(path):
+            return super().get_source(environment, template)
+
+        try:
+            mtime = os.path.getmtime(path)
+            source = pathlib.Path(path).read_text(encoding=self.encoding)
+        except OSError as err:
+            raise jinja2.TemplateNotFound(template) from err
+
+        def uptodate():
+            try:
+                return os.path.getmtime(path) == mtime
+            except OSError:
+                return False
+
+        return source, path, uptodate
+
+
+@functools.lru_cache(maxsize=1)
+def get_environment():
+    """returns the jinja2 environment shared by all the renders.
+
+    Compiled templates are kept in memory (and checked against the mtime
+    of their file), and their bytecode is cached on disk in the quizml
+    cache dir.
+    """
 
     try:
-        template_src = pathlib.Path(template_filename).read_text()
-        env = jinja2.Environment(
-            extensions=["jinja2.ext.do"],
-            comment_start_string="<#",
-            comment_end_string="#>",
-            block_start_string="<|",
-            block_end_string="|>",
-            variable_start_string="<<",
-            variable_end_string=">>",
-        )
-        env.globals["math"] = math
-        template = env.from_string(template_src)
-        render_content = template.render(context)
+        bytecode_dir = get_cache_dir() / "jinja"
+        bytecode_dir.mkdir(exist_ok=True)
+        bytecode_cache = jinja2.FileSystemBytecodeCache(str(bytecode_dir))
+    except OSError as err:
+        logging.debug(f"jinja bytecode cache disabled: {err}")
+        bytecode_cache = None
+
+    env = jinja2.Environment(
+        loader=TemplateLoader(filelocator.locate.dirlist),
+        bytecode_cache=bytecode_cache,
+        auto_reload=True,
+        extensions=["jinja2.ext.do"],
+        comment_start_string="<#",
+        comment_end_string="#>",
+        block_start_string="<|",
+        block_end_string="|>",
+        variable_start_string="<<",
+        variable_end_string=">>",
+    )
+    env.globals["math"] = math
+    return env
+
+
+def get_template_files(template_filename):
+    """returns the paths of a template file and of all the templates it
+    includes, imports or extends (as far as they can be resolved)."""
+
+    if template_filename.endswith(".docx"):
+        return [template_filename]
+
+    env = get_environment()
+    files = []
+    names = [template_filename]
+    seen = set()
+    while names:
+        name = names.pop()
+        if name in seen:
+            continue
+        seen.add(name)
+        try:
+            source, filename, _ = env.loader.get_source(env, name)
+            ast = env.parse(source)
+        except jinja2.TemplateError:
+            continue
+        files.append(filename)
+        names += [ref for ref in jinja2.meta.find_referenced_templates(ast) if ref]
+    return files
+
+
+@contextlib.contextmanager
+def template_errors(template_filename):
+    """turns the errors raised while loading or rendering a template into
+    Jinja2SyntaxError with an informative message."""
+
+    try:
+        yield
+
+    except jinja2.TemplateNotFound as exc:
+        msg = f"in {template_filename}\n\n"
+        msg = msg + "Template file not found.\n\n"
+        raise Jinja2SyntaxError(msg) from exc
 
     except jinja2.TemplateSyntaxError as exc:
         lineno = exc.lineno
-        lines = template_src.split("\n")
+        lines = (exc.source or "").split("\n")
         msg = f"in {template_filename}, line {lineno}\n\n"
         msg = msg + msg_context(lines, lineno) + "\n"
         msg = msg + text_wrap(exc.message)
@@ -52,10 +138,51 @@ def render_template(context, template_filename):
         msg = msg + f"{exc}" + "\n\n"
         raise Jinja2SyntaxError(msg) from exc
 
+
+def render_template(context, template_filename):
+    if not template_filename:
+        msg = "Template filename is missing, can't render jinja."
+        raise Jinja2SyntaxError(msg)
+
+    template_filename = str(template_filename)
+
+    with template_errors(template_filename):
+        template = get_environment().get_template(template_filename)
+        render_content = template.render(context)
+
     return render_content
 
 
-def render(yaml_data, template_filename, extra_context=None):
+def stream_template(context, template_filename, out_filename):
+    """renders a template straight into a file.
+
+    The document is generated chunk by chunk (`Template.generate`) into a
+    temporary file next to out_filename, which is then renamed, so that
+    the document is never held in memory as a whole, and out_filename is
+    never left half-written.
+    """
+
+    if not template_filename:
+        msg = "Template filename is missing, can't render jinja."
+        raise Jinja2SyntaxError(msg)
+
+    template_filename = str(template_filename)
+    out_path = pathlib.Path(out_filename)
+    tmp_path = out_path.with_name(f".{out_path.name}.{os.getpid()}.tmp")
+
+    try:
+        with template_errors(template_filename):
+            template = get_environment().get_template(template_filename)
+            with open(tmp_path, "w") as f:
+                for chunk in template.generate(context):
+                    f.write(chunk)
+        os.replace(tmp_path, out_path)
+    finally:
+        if tmp_path.exists():
+            tmp_path.unlink()
+
+
+def get_context(yaml_data, extra_context=None):
     context = {
         "header": yaml_data["header"],
         "questions": yaml_data["questions"],
@@ -65,6 +192,12 @@ def render(yaml_data, template_filename, extra_context=None):
     if extra_context:
         context.update(extra_context)
 
+    return context
+
+
+def render(yaml_data, template_filename, extra_context=None):
+    context = get_context(yaml_data, extra_context)
+
     if template_filename.endswith(".docx"):
         from quizml import docx_renderer
 
@@ -72,4 +205,15 @@ def render(yaml_data, template_filename, extra_context=None):
 
     return render_template(context, template_filename)
 
-    return ""
+
+def render_to_file(yaml_data, template_filename, out_filename, extra_context=None):
+    """renders the document straight into out_filename (see
+    stream_template)."""
+
+    if template_filename.endswith(".docx"):
+        rendered_doc = render(yaml_data, template_filename, extra_context)
+        pathlib.Path(out_filename).write_bytes(rendered_doc)
+        return
+
+    context = get_context(yaml_data, extra_context)
+    stream_template(context, template_filename, out_filename)
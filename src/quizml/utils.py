@@ -61,12 +61,78 @@ class MarkdownString(str):
 
 # --- Schema Helpers ---
 
-def apply_conditions(data, current_schema):
+def get_condition_const(cond_schema):
+    """
+    Returns the (property, value) pair of a condition of the form
+    {"properties": {prop: {"const": value}}}, or None for any other condition.
+    """
+    properties = cond_schema.get("properties")
+    if set(cond_schema) != {"properties"} or not isinstance(properties, dict):
+        return None
+    if len(properties) != 1:
+        return None
+    [(prop, value)] = properties.items()
+    if not isinstance(value, dict) or set(value) != {"const"}:
+        return None
+    return prop, value["const"]
+
+
+def compile_conditions(schema):
+    """
+    Precomputes, for each schema node whose allOf/anyOf/oneOf branches are
+    all conditions on the same property const (eg. the question `type`),
+    the table of the branches.
+
+    Returns a dictionary id(node) -> (property, {const: then-schema}), to
+    be passed to apply_conditions. The schema must be kept alive (and not
+    modified) while the table is in use.
+    """
+    branches = {}
+
+    def visit(node):
+        if isinstance(node, list):
+            for item in node:
+                visit(item)
+            return
+        if not isinstance(node, dict):
+            return
+
+        for key in ["allOf", "anyOf", "oneOf"]:
+            if "if" in node or key not in node:
+                continue
+            conds = [get_condition_const(sub.get("if", {})) for sub in node[key]]
+            if not conds or None in conds or len({prop for prop, _ in conds}) != 1:
+                continue
+            if not all(isinstance(const, (str, int, float, bool)) for _, const in conds):
+                continue
+            table = {}
+            for (_prop, const), sub_schema in zip(conds, node[key]):
+                table.setdefault(const, sub_schema.get("then", {}))
+            branches[id(node)] = (conds[0][0], table)
+            break
+
+        for value in node.values():
+            visit(value)
+
+    visit(schema)
+    return branches
+
+
+def apply_conditions(data, current_schema, branches=None):
     """
     Applies conditional logic (if/then/else) from JSON schema.
     Handles root if/then/else and those inside allOf/anyOf/oneOf.
     Returns the specific sub-schema to apply, or the original if no condition matches.
+
+    The branches precomputed by compile_conditions are looked up directly.
     """
+    if branches and id(current_schema) in branches:
+        prop, table = branches[id(current_schema)]
+        value = data.get(prop)
+        if isinstance(value, (str, int, float, bool)):
+            return table.get(value, current_schema)
+        return current_schema
+
     # Helper to check a condition
     def check_condition(cond_schema):
         if "properties" in cond_schema:
@@ -108,77 +174,174 @@ def is_format_markdown(schema_node):
 
 # --- Coercion Logic ---
 
-def coerce_value(value, schema):
+BOOLEAN_VALUES = {"true": True, "yes": True, "on": True,
+                  "false": False, "no": False, "off": False}
+
+
+def _identity(value):
+    return value
+
+
+def _to_markdown(value):
+    if isinstance(value, str):
+        return MarkdownString(value)
+    return value
+
+
+def _to_boolean(value):
+    return BOOLEAN_VALUES.get(value.lower(), value)
+
+
+def _to_number(cast):
+    def convert(value):
+        try:
+            return cast(value)
+        except ValueError:
+            return value
+    return convert
+
+
+def get_scalar_coercer(schema):
     """
-    Coerce a single value based on the schema type.
+    Returns the function that coerces a scalar value based on the schema type.
     """
-    # Check Markdown
     if is_format_markdown(schema):
-        if isinstance(value, str):
-            return MarkdownString(value)
-        return value
+        return _to_markdown
 
     types = schema.get("type", [])
     if isinstance(types, str):
         types = [types]
 
+    converters = []
     if "boolean" in types:
-        if isinstance(value, str):
-            if value.lower() in ["true", "yes", "on"]:
-                return True
-            if value.lower() in ["false", "no", "off"]:
-                return False
-    
+        converters.append(_to_boolean)
     if "integer" in types:
-        if isinstance(value, str):
-            try:
-                return int(value)
-            except ValueError:
-                pass
-    
+        converters.append(_to_number(int))
     if "number" in types:
-        if isinstance(value, str):
-            try:
-                return float(value)
-            except ValueError:
-                pass
-                
-    return value
+        converters.append(_to_number(float))
+
+    if not converters:
+        return _identity
+
+    def coerce(value):
+        if not isinstance(value, str):
+            return value
+        for convert in converters:
+            converted = convert(value)
+            if converted is not value:
+                return converted
+        return value
+
+    return coerce
+
+
+def coerce_value(value, schema):
+    """
+    Coerce a single value based on the schema type.
+    """
+    return get_scalar_coercer(schema)(value)
+
+
+class CoercionPlan:
+    """
+    A schema compiled into coercion functions.
 
+    Each schema node is compiled (on first use) into a function that
+    coerces the values it describes. For dicts, the properties of each
+    conditional branch (eg. of each question type) are compiled into a
+    table of property -> coercer, so that coercing a question is a
+    branch lookup and a single pass over its fields.
 
-def coerce_data(yaml_data, schema):
+    Dicts and lists are coerced in place.
+    """
+
+    def __init__(self, schema, branches=None):
+        self.schema = schema
+        self.branches = compile_conditions(schema) if branches is None else branches
+        # coercers and property tables, keyed by id of the schema node
+        self._coercers = {}
+        self._properties = {}
+
+    def coerce(self, data):
+        return self.get_coercer(self.schema)(data)
+
+    def get_coercer(self, schema):
+        if not schema:
+            return _identity
+        coercer = self._coercers.get(id(schema))
+        if coercer is None:
+            coercer = self._coercers[id(schema)] = self._compile(schema)
+        return coercer
+
+    def get_property_coercers(self, schema):
+        """returns the table property -> coercer of a schema node (the
+        properties that are left as they are are not in the table)."""
+        table = self._properties.get(id(schema))
+        if table is None:
+            table = {}
+            self._properties[id(schema)] = table
+            for key, sub_schema in schema.get("properties", {}).items():
+                coercer = self.get_coercer(sub_schema)
+                if coercer is not _identity:
+                    table[key] = coercer
+        return table
+
+    def _compile(self, schema):
+        coerce_scalar = get_scalar_coercer(schema)
+        is_conditional = "if" in schema or any(
+            key in schema for key in ["allOf", "anyOf", "oneOf"]
+        )
+
+        # leaf nodes (eg. markdown fields) are coerced directly
+        if not (is_conditional or "properties" in schema or "items" in schema):
+            return coerce_scalar
+
+        items_schema = schema.get("items", {})
+        tabulated = self.branches.get(id(schema))
+
+        def get_table(data):
+            if tabulated is not None:
+                prop, then_schemas = tabulated
+                value = data.get(prop)
+                if isinstance(value, (str, int, float, bool)):
+                    return self.get_property_coercers(then_schemas.get(value, schema))
+                return self.get_property_coercers(schema)
+            if is_conditional:
+                return self.get_property_coercers(apply_conditions(data, schema))
+            return self.get_property_coercers(schema)
+
+        def coerce(data):
+            if isinstance(data, dict):
+                table = get_table(data)
+                for key, value in data.items():
+                    coerce_field = table.get(key)
+                    if coerce_field is not None:
+                        data[key] = coerce_field(value)
+                return data
+            if isinstance(data, list):
+                coerce_item = self.get_coercer(items_schema)
+                if coerce_item is not _identity:
+                    for i, item in enumerate(data):
+                        data[i] = coerce_item(item)
+                return data
+            return coerce_scalar(data)
+
+        return coerce
+
+
+def coerce_data(yaml_data, schema, plan=None):
     """
     Traverses the yaml_data (specifically questions) and coerces types
-    (int, float, bool, MarkdownString) based on the provided schema.
+    (int, float, bool, MarkdownString) in place, based on the provided
+    schema.
+
+    `plan` is the CoercionPlan of the schema, if already compiled.
     """
-    
-    def coerce_recursive(data, current_schema):
-        if not current_schema:
-            return data
-
-        if isinstance(data, dict):
-            refined_schema = apply_conditions(data, current_schema)
-            new_dict = {}
-            properties = refined_schema.get("properties", {})
-            for key, value in data.items():
-                if key in properties:
-                    new_dict[key] = coerce_recursive(value, properties[key])
-                else:
-                    new_dict[key] = value
-            return new_dict
-
-        elif isinstance(data, list):
-            new_list = []
-            items_schema = current_schema.get("items", {})
-            for item in data:
-                new_list.append(coerce_recursive(item, items_schema))
-            return new_list
-        
-        else:
-            return coerce_value(data, current_schema)
 
     if isinstance(yaml_data, dict) and "questions" in yaml_data and schema:
-        yaml_data["questions"] = coerce_recursive(yaml_data["questions"], schema)
+        if plan is None:
+            plan = CoercionPlan(schema)
+        yaml_data["questions"] = plan.coerce(yaml_data["questions"])
     
     return yaml_data
 
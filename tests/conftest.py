@@ -0,0 +1,16 @@
+import pytest
+
+from quizml import cache
+
+
+@pytest.fixture(autouse=True)
+def tmp_cache_dir(tmp_path_factory, monkeypatch):
+    """points the cache of every test to a temporary directory, so that
+    the tests never read or write the user's cache."""
+    cache_dir = tmp_path_factory.mktemp("cache")
+    monkeypatch.setattr(cache, "CACHE_DIR", str(cache_dir))
+    cache.close_cache()
+    cache.get_cache_dir.cache_clear()
+    yield cache_dir
+    cache.close_cache()
+    cache.get_cache_dir.cache_clear()
@@ -0,0 +1,95 @@
+import json
+
+import pytest
+
+from quizml import cache
+
+
+def test_put_get_many():
+    cache.put_many({"a": "<img src='a'>", "b": "<math>b</math>"})
+    found = cache.get_many(["a", "b", "c"])
+    assert found == {"a": "<img src='a'>", "b": "<math>b</math>"}
+
+
+def test_get_from_cache_missing():
+    assert cache.get_from_cache("missing") is None
+    cache.save_to_cache("key", "value")
+    assert cache.get_from_cache("key") == "value"
+
+
+def test_put_get_blob():
+    assert cache.get_blob("blob") is None
+    cache.put_blob("blob", b"\x80\x04binary")
+    cache.put_many({"json": "text"})
+    assert cache.get_blob("blob") == b"\x80\x04binary"
+    assert cache.get_blob("json") is None
+    assert cache.get_many(["blob", "json"]) == {"json": "text"}
+    assert cache.get_cache_stats()["entries"] == 2
+
+
+def test_cache_persists_across_connections(tmp_cache_dir):
+    cache.put_many({"k": "v"})
+    cache.close_cache()
+    assert cache.get_many(["k"]) == {"k": "v"}
+    assert (tmp_cache_dir / cache.CACHE_DB_FILENAME).exists()
+
+
+def test_migrate_legacy_cache(tmp_cache_dir):
+    (tmp_cache_dir / "deadbeef.json").write_text(json.dumps("<img src='x'>"))
+    (tmp_cache_dir / "broken.json").write_text("{not json")
+
+    assert cache.get_from_cache("deadbeef") == "<img src='x'>"
+    # unreadable files are kept
+    assert [path.name for path in tmp_cache_dir.glob("*.json")] == ["broken.json"]
+
+
+def test_migrate_legacy_cache_write_failure(tmp_cache_dir, monkeypatch):
+    cache.get_many(["init"])
+    (tmp_cache_dir / "deadbeef.json").write_text(json.dumps("<img src='x'>"))
+
+    monkeypatch.setattr(cache, "put_many", lambda items: False)
+    assert cache.migrate_legacy_cache() == 0
+    assert (tmp_cache_dir / "deadbeef.json").exists()
+
+
+def test_lru_eviction(monkeypatch):
+    cache.set_max_size(250)
+    try:
+        cache.put_many({"old": "x" * 100})
+        cache.put_many({"recent": "y" * 100})
+        # reading "old" makes "recent" the least recently used entry
+        monkeypatch.setattr(cache.time, "time", lambda: 2e10)
+        assert "old" in cache.get_many(["old"])
+        cache.put_many({"new": "z" * 100})
+    finally:
+        cache.set_max_size(cache.DEFAULT_MAX_SIZE)
+
+    assert set(cache.get_many(["old", "recent", "new"])) == {"old", "new"}
+
+
+def test_prune_and_stats():
+    cache.put_many({f"k{i}": "x" * 100 for i in range(10)})
+    cache.get_many(["k0", "k1", "missing"])
+
+    stats = cache.get_cache_stats()
+    assert stats["entries"] == 10
+    assert stats["hits"] == 2
+    assert stats["misses"] == 1
+
+    deleted = cache.prune_cache("500")
+    assert deleted == 6
+    assert cache.get_cache_stats()["bytes"] <= 500
+
+
+def test_parse_size():
+    assert cache.parse_size("500MB") == 500 * 1024**2
+    assert cache.parse_size("2G") == 2 * 1024**3
+    assert cache.parse_size("1024") == 1024
+    with pytest.raises(ValueError):
+        cache.parse_size("lots")
+
+
+def test_get_many_large_batch():
+    items = {f"eq{i}": f"<img {i}>" for i in range(2 * cache.QUERY_CHUNK_SIZE + 1)}
+    cache.put_many(items)
+    assert cache.get_many(items) == items
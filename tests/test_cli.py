@@ -88,3 +88,9 @@ def test_info_command(capsys):
     
     for key in expected_keys:
         assert key in data
+
+@patch('quizml.cli.cache.print_cache_stats')
+def test_cache_stats(mock_print_cache_stats):
+    with patch.object(sys, 'argv', ['quizml', '--cache', 'stats']):
+        main()
+    mock_print_cache_stats.assert_called_once()
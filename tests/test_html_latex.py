@@ -1,11 +1,32 @@
+import re
+import threading
+import time
 from pathlib import Path
 from unittest.mock import MagicMock, patch
 
 import pytest
 
-from quizml.exceptions import LatexCompilationError
+from quizml.exceptions import LatexCompilationError, LatexEquationsError
 from quizml.markdown.extensions import MathDisplay, MathInline
-from quizml.markdown.html_renderer import build_eq_dict_PNG
+from quizml.markdown.html_renderer import (
+    build_eq_dict_MathML_fast,
+    build_eq_dict_PNG,
+    build_eq_dict_SVG,
+    compile_eq_shards,
+    get_css_inliner,
+    get_eq_sources,
+    get_html_dict,
+    split_into_shards,
+    strip_newlines_and_tabs,
+)
+from quizml.markdown.markdown import MarkdownTranscoder
+from quizml.markdown.mathml import (
+    SUPPORTED_ENVIRONMENTS,
+    SUPPORTED_MACROS,
+    latex_to_mathml,
+)
+from quizml.markdown.utils import get_hash
+from quizml.utils import MarkdownString
 
 
 # Helper functions to create correctly-structured mock tokens
@@ -22,17 +43,17 @@ def create_mock_display(content):
     return MathDisplay([content])
 
 
-@patch('quizml.markdown.html_renderer.save_to_cache')
-@patch('quizml.markdown.html_renderer.get_from_cache')
+@patch('quizml.markdown.html_renderer.put_many')
+@patch('quizml.markdown.html_renderer.get_many')
 @patch('quizml.markdown.html_renderer.embed_base64')
 @patch('quizml.markdown.html_renderer.LatexRunner')
-def test_build_eq_dict_png_success(MockLatexRunner, mock_embed_base64, mock_get_from_cache, mock_save_to_cache):
+def test_build_eq_dict_png_success(MockLatexRunner, mock_embed_base64, mock_get_many, mock_put_many):
     """
     Tests that build_eq_dict_PNG successfully generates an image dictionary
     by mocking the external pdflatex and gs commands.
     """
     # 0. Setup Cache Mock
-    mock_get_from_cache.return_value = None
+    mock_get_many.return_value = {}
 
     # 1. Setup Mocks
     mock_latex_runner_instance = MockLatexRunner.return_value.__enter__.return_value
@@ -68,6 +89,10 @@ def test_build_eq_dict_png_success(MockLatexRunner, mock_embed_base64, mock_get_
     mock_embed_base64.assert_any_call(Path("/tmp/img2.png"))
 
     assert len(eq_dict) == 2
+
+    # all new equations are saved in a single cache write
+    mock_put_many.assert_called_once()
+    assert len(mock_put_many.call_args[0][0]) == 2
     
     # Robust assertions checking for key parts of the generated HTML
     inline_html = eq_dict["##Inline##" + r"$E=mc^2$"]
@@ -84,15 +109,15 @@ def test_build_eq_dict_png_success(MockLatexRunner, mock_embed_base64, mock_get_
     assert "height='40'" in display_html
 
 
-@patch('quizml.markdown.html_renderer.get_from_cache')
+@patch('quizml.markdown.html_renderer.get_many')
 @patch('quizml.markdown.html_renderer.LatexRunner')
-def test_build_eq_dict_png_latex_error(MockLatexRunner, mock_get_from_cache):
+def test_build_eq_dict_png_latex_error(MockLatexRunner, mock_get_many):
     """
     Tests that build_eq_dict_PNG properly propagates a LatexCompilationError
     if the mocked pdflatex command fails.
     """
     # 0. Setup Cache Mock
-    mock_get_from_cache.return_value = None
+    mock_get_many.return_value = {}
 
     # 1. Setup Mock
     mock_latex_runner_instance = MockLatexRunner.return_value.__enter__.return_value
@@ -109,3 +134,244 @@ def test_build_eq_dict_png_latex_error(MockLatexRunner, mock_get_from_cache):
     # 4. Assert that gs was not called
     mock_latex_runner_instance.run_gs_png.assert_not_called()
 
+
+
+def test_split_into_shards():
+    eq_list = list(range(100))
+    shards = split_into_shards(eq_list, jobs=4)
+    assert len(shards) == 4
+    assert [eq for shard in shards for eq in shard] == eq_list
+
+    # small batches are not split
+    assert split_into_shards(eq_list[:10], jobs=4) == [eq_list[:10]]
+
+
+@patch('quizml.markdown.html_renderer.put_many')
+@patch('quizml.markdown.html_renderer.get_many')
+@patch('quizml.markdown.html_renderer.embed_base64')
+@patch('quizml.markdown.html_renderer.LatexRunner')
+def test_build_eq_dict_svg_sharded(MockLatexRunner, mock_embed_base64, mock_get_many, mock_put_many):
+    """
+    Tests that equations compiled in parallel shards are merged back
+    with the right equation.
+    """
+    mock_get_many.return_value = {}
+
+    # the fake dvi 'path' is the latex source, and each svg 'file' is the
+    # content of the corresponding standalone environment
+    mock_latex_runner_instance = MockLatexRunner.return_value.__enter__.return_value
+    mock_latex_runner_instance.run_latex_dvi.side_effect = lambda content, **kwargs: content
+    mock_latex_runner_instance.run_dvisvgm_svg.side_effect = lambda content: re.findall(
+        r"\\begin\{standalone\}(.*?)\\end\{standalone\}", content
+    )
+    mock_embed_base64.side_effect = lambda svg: (1, 1, "data:" + svg)
+
+    eq_list = [create_mock_display(f"$$x_{{{i}}}$$") for i in range(40)]
+    eq_dict = build_eq_dict_SVG(eq_list, {"jobs": 4})
+
+    assert mock_latex_runner_instance.run_latex_dvi.call_count == 4
+    assert len(eq_dict) == 40
+    for eq in eq_list:
+        assert f"src='data:{eq.content}'" in eq_dict["##Display##" + eq.content]
+
+
+@patch('quizml.markdown.html_renderer.put_many')
+@patch('quizml.markdown.html_renderer.get_many')
+@patch('quizml.markdown.html_renderer.embed_base64')
+@patch('quizml.markdown.html_renderer.LatexRunner')
+def test_build_eq_dict_svg_bisects_errors(MockLatexRunner, mock_embed_base64, mock_get_many, mock_put_many):
+    """
+    Tests that a failing equation is isolated, and that all the other
+    equations are still rendered and cached.
+    """
+    mock_get_many.return_value = {}
+
+    def fake_latex(content, **kwargs):
+        if "BAD" in content:
+            raise LatexCompilationError("! Undefined control sequence.")
+        return content
+
+    mock_latex_runner_instance = MockLatexRunner.return_value.__enter__.return_value
+    mock_latex_runner_instance.run_latex_dvi.side_effect = fake_latex
+    mock_latex_runner_instance.run_dvisvgm_svg.side_effect = lambda content: re.findall(
+        r"\\begin\{standalone\}(.*?)\\end\{standalone\}", content
+    )
+    mock_embed_base64.side_effect = lambda svg: (1, 1, "data:" + svg)
+
+    eq_list = [create_mock_display(f"$$x_{{{i}}}$$") for i in range(20)]
+    eq_list[13] = create_mock_display(r"$$\BAD$$")
+
+    with pytest.raises(LatexEquationsError) as excinfo:
+        build_eq_dict_SVG(eq_list, {"jobs": 2})
+
+    assert excinfo.value.failures == [(r"$$\BAD$$", "! Undefined control sequence.")]
+
+    # all the other equations were cached
+    cached = {}
+    for call in mock_put_many.call_args_list:
+        cached.update(call[0][0])
+    assert len(cached) == 19
+
+
+
+def test_compile_eq_shards_common_error():
+    """
+    Tests that an error shared by all the equations (eg. in the preamble)
+    is not bisected, and that at most `jobs` batches run at a time.
+    """
+    lock = threading.Lock()
+    running = []
+    calls = []
+
+    def compile_shard(batch):
+        with lock:
+            calls.append(batch)
+            running.append(batch)
+            max_running[0] = max(max_running[0], len(running))
+        time.sleep(0.01)
+        with lock:
+            running.remove(batch)
+        raise LatexCompilationError(f"! LaTeX Error: File `missing.sty' not found.\n{batch[0]}")
+
+    max_running = [0]
+    eq_list = [create_mock_inline(f"$x_{{{i}}}$") for i in range(300)]
+    renders, failures = compile_eq_shards(compile_shard, eq_list, {"jobs": 4})
+
+    assert renders == {}
+    assert len(calls) == 4
+    assert max_running[0] <= 4
+    assert len(failures) == 1 and len(failures[0][0]) == 300
+
+
+@pytest.mark.parametrize("jobs", [1, 2, 4])
+def test_compile_eq_shards_different_errors(jobs):
+    """
+    Tests that different equations failing with the same message are
+    still isolated.
+    """
+
+    def compile_shard(batch):
+        for i, eq in enumerate(batch):
+            if "\\fooo" in eq.content or "\\barr" in eq.content:
+                raise LatexCompilationError(
+                    f"! Undefined control sequence.\nl.{10 + i} \\hbox{{{eq.content}\n"
+                )
+        return [eq.content for eq in batch]
+
+    eq_list = [create_mock_inline(f"$x_{{{i}}}$") for i in range(40)]
+    eq_list[3] = create_mock_inline("$\\fooo$")
+    eq_list[30] = create_mock_inline("$\\barr$")
+    renders, failures = compile_eq_shards(compile_shard, eq_list, {"jobs": jobs})
+
+    assert len(renders) == 38
+    assert sorted(eq.content for eqs, _ in failures for eq in eqs) == ["$\\barr$", "$\\fooo$"]
+
+
+def test_locate_eq_errors():
+    yaml_data = {
+        "header": {},
+        "questions": [
+            {"type": "ma", "question": MarkdownString("an eq $x^2$")},
+            {"type": "ma", "question": MarkdownString("another $y$ and $x^2$")},
+        ],
+    }
+    transcoder = MarkdownTranscoder(yaml_data)
+
+    sources = get_eq_sources(transcoder.doc_combined)
+    assert sources == {
+        "$x^2$": get_hash("an eq $x^2$"),
+        "$y$": get_hash("another $y$ and $x^2$"),
+    }
+
+    err = transcoder.locate_eq_errors(LatexEquationsError([("$y$", "! Oops.")]))
+    assert err.failures == [("$y$", "! Oops.")]
+    assert "[Q2] $y$" in str(err)
+    assert "in: another $y$ and $x^2$" in str(err)
+
+
+def test_strip_newlines_and_tabs():
+    html_content = '<p>a\nb\tc</p>\n<pre><code class="x">line 1\nline 2\n</code></pre>\n<CODE>z\n</CODE>'
+    assert strip_newlines_and_tabs(html_content) == (
+        '<p>a b  c</p> <pre><code class="x">line 1<br/>line 2<br/></code></pre> <CODE>z<br/></CODE>'
+    )
+
+
+def test_get_html_dict_inlines_css_once():
+    yaml_data = {
+        "header": {},
+        "questions": [
+            {"type": "essay", "question": MarkdownString(f"entry *{i}*")} for i in range(3)
+        ],
+    }
+    transcoder = MarkdownTranscoder(yaml_data)
+    opts = {"fmt": "html", "html_css": "/* comment */ em {color: red}\nh1 {color: blue}"}
+
+    with patch("quizml.markdown.html_renderer.get_css_inliner", wraps=get_css_inliner) as mock:
+        d = get_html_dict(transcoder.doc_combined, transcoder.md_list, opts)
+
+    assert mock.call_count == 1
+    assert d["entry *1*"] == '<p>entry <em style="color: red;">1</em></p>'
+
+
+def test_get_html_dict_structural_selectors():
+    md_list = [f"first {i}\n\nsecond {i}" for i in range(3)]
+    yaml_data = {
+        "header": {},
+        "questions": [{"type": "essay", "question": MarkdownString(md)} for md in md_list],
+    }
+    transcoder = MarkdownTranscoder(yaml_data)
+    css = "p {color: blue}\np:first-child {color: red}\nh1 + p {font-weight: bold}"
+    d = get_html_dict(transcoder.doc_combined, transcoder.md_list, {"fmt": "html", "html_css": css})
+
+    for i, md in enumerate(md_list):
+        assert d[md] == (
+            f'<p style="color: red;">first {i}</p> <p style="color: blue;">second {i}</p>'
+        )
+
+
+def test_latex_to_mathml():
+    inline = latex_to_mathml("$\\frac{a}{b}$")
+    assert 'display="inline"' in inline
+    assert "<mfrac>" in inline
+
+    display = latex_to_mathml("\\begin{align}x &= 1\\\\ y &= 2\\end{align}")
+    assert 'display="block"' in display
+    assert latex_to_mathml("$$\\alpha$$") == latex_to_mathml("\\[\\alpha\\]")
+
+    # macros and environments that are not whitelisted
+    assert latex_to_mathml("$\\mymacro{x}$") is None
+    assert latex_to_mathml("\\begin{multline}x\\end{multline}") is None
+
+
+def test_mathml_whitelist_is_converted():
+    """
+    Tests that every whitelisted macro and environment is converted,
+    without leftover control sequences (eg. <mi>\\arg</mi>).
+    """
+    equations = ["$\\left( x \\right)$"]
+    for env in SUPPORTED_ENVIRONMENTS:
+        equations.append(f"$\\begin{{{env}}} a & b \\\\ c & d \\end{{{env}}}$")
+    for macro in SUPPORTED_MACROS - {"begin", "end", "left", "right"}:
+        forms = [f"$\\{macro}$", f"$\\{macro}{{x}}$", f"$\\{macro}{{x}}{{y}}$"]
+        forms.append(f"$\\{macro}(x\\{macro})$")
+        converted = [eq for eq in forms if latex_to_mathml(eq) is not None]
+        assert converted, macro
+        equations += converted
+
+    for eq in equations:
+        mathml = latex_to_mathml(eq)
+        assert mathml is not None, eq
+        assert not re.search(r"\\[a-zA-Z]+", mathml), eq
+
+
+@patch("quizml.markdown.html_renderer.build_eq_dict_MathML")
+def test_build_eq_dict_mathml_fast_fallback(mock_build_eq_dict_MathML):
+    eq1 = create_mock_inline("$x^2$")
+    eq2 = create_mock_display("$$\\mymacro{x}$$")
+    mock_build_eq_dict_MathML.return_value = {"##Display##$$\\mymacro{x}$$": "<math>make4ht</math>"}
+
+    eq_dict = build_eq_dict_MathML_fast([eq1, eq2], {"fmt": "html-mathml-fast"})
+
+    assert "<msup>" in eq_dict["##Inline##$x^2$"]
+    assert eq_dict["##Display##$$\\mymacro{x}$$"] == "<math>make4ht</math>"
+    mock_build_eq_dict_MathML.assert_called_once_with([eq2], {"fmt": "html-mathml-fast"})
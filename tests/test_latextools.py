@@ -0,0 +1,162 @@
+import subprocess
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from quizml.exceptions import DvisvgmNotFoundError, LatexNotFoundError
+from quizml.markdown import latextools
+
+
+@pytest.fixture(autouse=True)
+def reset_latextools():
+    latextools._format_files.clear()
+    latextools.set_tool_paths({})
+    latextools.find_tool.cache_clear()
+    latextools.get_tool_info.cache_clear()
+    yield
+    latextools._format_files.clear()
+    latextools.set_tool_paths({})
+    latextools.find_tool.cache_clear()
+    latextools.get_tool_info.cache_clear()
+
+
+def fake_ini_run(cmd, cwd, **kwargs):
+    """pretends to be `latex -ini`: writes the format file in cwd."""
+    assert "-ini" in cmd and "mylatexformat.ltx" in cmd
+    Path(cwd, latextools.FORMAT_NAME + ".fmt").write_text("fmt")
+    return subprocess.CompletedProcess(cmd, 0, stdout="")
+
+
+@patch("quizml.markdown.latextools.shutil.which", return_value=None)
+def test_get_format_file_no_engine(mock_which):
+    assert latextools.get_format_file("latex", "\\begin{document}") is None
+
+
+@patch("quizml.markdown.latextools.subprocess.run", side_effect=fake_ini_run)
+@patch("quizml.markdown.latextools.shutil.which", return_value=__file__)
+def test_get_format_file_is_cached(mock_which, mock_run, tmp_cache_dir):
+    preamble = "\\documentclass{article}\n\\begin{document}\n"
+
+    fmt_path = latextools.get_format_file("latex", preamble)
+    assert fmt_path.exists()
+    assert fmt_path.parent == tmp_cache_dir / "formats"
+
+    # second call is served from memory, and a new process from disk
+    assert latextools.get_format_file("latex", preamble) == fmt_path
+    latextools._format_files.clear()
+    assert latextools.get_format_file("latex", preamble) == fmt_path
+    assert mock_run.call_count == 1
+
+    # a different preamble gets its own format
+    assert latextools.get_format_file("latex", preamble + "%") != fmt_path
+
+
+@patch("quizml.markdown.latextools.subprocess.run")
+@patch("quizml.markdown.latextools.shutil.which", return_value=__file__)
+def test_get_format_file_build_failure(mock_which, mock_run):
+    mock_run.return_value = subprocess.CompletedProcess([], 1, stdout="! error")
+    assert latextools.get_format_file("latex", "\\begin{document}") is None
+
+
+@patch("quizml.markdown.latextools.shutil.which", return_value=None)
+def test_find_tool_missing(mock_which):
+    # runners no longer check for all the tools upfront
+    with latextools.LatexRunner() as runner:
+        assert runner.temp_dir.exists()
+
+    with pytest.raises(DvisvgmNotFoundError):
+        latextools.find_tool("dvisvgm")
+    with pytest.raises(LatexNotFoundError, match="in PATH"):
+        latextools.find_tool("latex")
+
+
+@patch("quizml.markdown.latextools.shutil.which", side_effect=lambda name: name)
+def test_find_tool_configured_and_memoized(mock_which):
+    latextools.set_tool_paths({"gs": "/opt/bin/gs"})
+
+    assert latextools.find_tool("gs") == "/opt/bin/gs"
+    assert latextools.find_tool("gs") == "/opt/bin/gs"
+    assert latextools.find_tool("latex") == "latex"
+    assert mock_which.call_count == 2
+
+    # loading the same config again keeps the memoized lookups
+    latextools.set_tool_paths({"gs": "/opt/bin/gs"})
+    assert latextools.find_tool("latex") == "latex"
+    assert mock_which.call_count == 2
+
+    latextools.set_tool_paths({})
+    assert latextools.find_tool("gs") == "gs"
+    assert mock_which.call_count == 3
+
+
+@patch("quizml.markdown.latextools.subprocess.run")
+@patch("quizml.markdown.latextools.shutil.which")
+def test_get_tool_info(mock_which, mock_run):
+    mock_which.side_effect = lambda name: None if name == "make4ht" else "/bin/" + name
+    mock_run.return_value = subprocess.CompletedProcess([], 0, stdout="\nTool 1.0\nmore\n")
+
+    info = latextools.get_tool_info()
+    assert info["latex"] == {"path": "/bin/latex", "version": "Tool 1.0"}
+    assert info["make4ht"] == {"path": None, "version": None}
+
+    # the probe runs once per process
+    assert latextools.get_tool_info() is info
+    assert mock_run.call_count == len(latextools.TOOLS) - 1
+
+
+@pytest.fixture
+def fake_engine(tmp_path, monkeypatch):
+    """a fake TeX engine that echoes the line it reads from stdin and the
+    batch file it is asked to \\input."""
+    engine = tmp_path / "fakelatex"
+    engine.write_text(
+        "#!/usr/bin/env python3\n"
+        "import sys, re, pathlib\n"
+        "line = sys.stdin.readline()\n"
+        "print('read:', line.strip())\n"
+        "batch = re.search(r'input\\{(.*)\\}', line).group(1)\n"
+        "print(pathlib.Path(batch).read_text())\n"
+    )
+    engine.chmod(0o755)
+    monkeypatch.setattr(latextools, "get_format_file", lambda engine, preamble: None)
+    return str(engine)
+
+
+def test_latex_worker_protocol(fake_engine):
+    preamble = "\\documentclass{article}\n\\begin{document}\n"
+    body = "\\begin{standalone}$x$\\end{standalone}\n\\end{document}\n"
+
+    with latextools.LatexWorker(fake_engine, preamble) as worker:
+        assert worker.is_alive()
+        returncode, stdout = worker._run_engine(fake_engine, preamble + body, preamble)
+
+    assert returncode == 0
+    assert "read: \\input{batch.tex}" in stdout
+    assert body.strip() in stdout
+
+
+@patch("quizml.markdown.latextools.LatexWorker")
+def test_worker_pool_take(MockLatexWorker):
+    MockLatexWorker.side_effect = lambda engine, preamble: MagicMock(preamble=preamble)
+    latextools.start_worker_pool(jobs=2)
+    try:
+        # no warm worker on first call, but one per slot is started for next time
+        assert latextools.take_warm_worker("latex", "pre") is None
+        assert MockLatexWorker.call_count == 2
+
+        # each shard gets a warm worker, and the pool is topped up
+        workers = [latextools.take_warm_worker("latex", "pre") for _ in range(2)]
+        assert all(worker.preamble == "pre" for worker in workers)
+        assert workers[0] is not workers[1]
+        assert MockLatexWorker.call_count == 4
+
+        # the workers of an older preamble are retired
+        stale = list(latextools._worker_pool._workers[("latex", "pre")])
+        assert latextools.take_warm_worker("latex", "new pre") is None
+        assert all(worker.cleanup.called for worker in stale)
+        assert list(latextools._worker_pool._workers) == [("latex", "new pre")]
+    finally:
+        latextools.stop_worker_pool()
+
+    assert latextools.take_warm_worker("latex", "pre") is None
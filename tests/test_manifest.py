@@ -0,0 +1,75 @@
+import pytest
+
+from quizml.cli.manifest import (
+    BuildManifest,
+    get_common_fingerprint,
+    get_target_fingerprints,
+)
+
+
+@pytest.fixture
+def quiz(tmp_path):
+    (tmp_path / "quiz.yaml").write_text("- type: essay\n  question: hello\n")
+    (tmp_path / "schema.json").write_text("{}")
+    (tmp_path / "base.j2").write_text("<< header >>")
+    (tmp_path / "quiz.j2").write_text('<| extends "' + str(tmp_path / "base.j2") + '" |>')
+    (tmp_path / "fig.png").write_bytes(b"png")
+
+    targets = [
+        {"name": "latex", "out": str(tmp_path / "quiz.tex"), "template": str(tmp_path / "quiz.j2")},
+        {"name": "pdf", "out": str(tmp_path / "quiz.pdf"), "dep": "latex", "build_cmd": "latexmk"},
+    ]
+    return tmp_path, targets
+
+
+def fingerprints(tmp_path, targets, config=None):
+    common = get_common_fingerprint(
+        tmp_path / "quiz.yaml", tmp_path / "schema.json", config or {}, [tmp_path / "fig.png"]
+    )
+    return get_target_fingerprints(targets, common)
+
+
+def test_fingerprints_track_inputs(quiz):
+    tmp_path, targets = quiz
+    ref = fingerprints(tmp_path, targets)
+    assert fingerprints(tmp_path, targets) == ref
+
+    # included templates, images and config changes are all tracked,
+    # and propagate to the dependent targets
+    for change in [
+        lambda: (tmp_path / "base.j2").write_text("changed"),
+        lambda: (tmp_path / "fig.png").write_bytes(b"changed"),
+    ]:
+        change()
+        new = fingerprints(tmp_path, targets)
+        assert new["latex"] != ref["latex"] and new["pdf"] != ref["pdf"]
+        ref = new
+
+    assert fingerprints(tmp_path, targets, {"cache_max_size": "1MB"}) != ref
+
+    # jobs has no effect on the output
+    targets[0]["jobs"] = 4
+    assert fingerprints(tmp_path, targets) == ref
+
+
+def test_manifest_up_to_date(quiz):
+    tmp_path, targets = quiz
+    latex = targets[0]
+    fp = fingerprints(tmp_path, targets)["latex"]
+
+    manifest = BuildManifest(tmp_path / "quiz.yaml")
+    assert not manifest.is_up_to_date(latex, fp)
+
+    (tmp_path / "quiz.tex").write_text("output")
+    manifest.record(latex, fp)
+    manifest.save()
+
+    manifest = BuildManifest(tmp_path / "quiz.yaml")
+    assert manifest.is_up_to_date(latex, fp)
+    assert not manifest.is_up_to_date(latex, "other fingerprint")
+
+    # the output was modified or deleted since the build
+    (tmp_path / "quiz.tex").write_text("edited output")
+    assert not manifest.is_up_to_date(latex, fp)
+    (tmp_path / "quiz.tex").unlink()
+    assert not manifest.is_up_to_date(latex, fp)
@@ -1,17 +1,20 @@
 import os
+from unittest.mock import patch
 
 import pytest
 from mistletoe import block_token, span_token
 
+from quizml import cache
+from quizml.loader import load
+from quizml.markdown.markdown import MarkdownTranscoder
+from quizml.utils import MarkdownString
+
 
 @pytest.fixture(autouse=True)
 def reset_mistletoe_tokens():
     block_token.reset_tokens()
     span_token.reset_tokens()
 
-from quizml.loader import load
-from quizml.markdown.markdown import MarkdownTranscoder
-
 
 def test_markdown_transcoding_html():
     pkg_dirname = os.path.dirname(__file__)
@@ -71,4 +74,173 @@ def test_markdown_transcoding_latex():
     choice_0_md = yamldoc['questions'][0]['choices'][0]['x']
     key_c0 = choice_0_md
     assert key_c0 in latex_md_dict
-    assert r"\includegraphics" in latex_md_dict[key_c0] # ![pic] -> \includegraphics
\ No newline at end of file
+    assert r"\includegraphics" in latex_md_dict[key_c0] # ![pic] -> \includegraphics
+
+
+def test_markdown_entry_cache():
+    def get_yaml(question_2):
+        return {
+            "header": {},
+            "questions": [
+                {"type": "essay", "question": MarkdownString("*first* question")},
+                {"type": "essay", "question": MarkdownString(question_2)},
+            ],
+        }
+
+    transcoder = MarkdownTranscoder(get_yaml("second question"))
+    d = transcoder.get_dict(opts={"fmt": "latex"})
+    assert d["*first* question"] == r"\textit{first} question"
+
+    # only the modified entry is parsed and rendered on the next build
+    transcoder = MarkdownTranscoder(get_yaml("**modified** question"))
+    with patch.object(transcoder, "parse", wraps=transcoder.parse) as mock_parse:
+        d = transcoder.get_dict(opts={"fmt": "latex"})
+    mock_parse.assert_called_once_with(["**modified** question"])
+    assert d["*first* question"] == r"\textit{first} question"
+    assert d["**modified** question"] == r"\textbf{modified} question"
+
+    # nothing is parsed when all the entries are cached
+    transcoder = MarkdownTranscoder(get_yaml("**modified** question"))
+    with patch.object(transcoder, "parse") as mock_parse:
+        transcoder.get_dict(opts={"fmt": "latex"})
+    mock_parse.assert_not_called()
+
+
+def test_transcoded_tree_shared_between_targets():
+    yaml_data = {
+        "header": {},
+        "questions": [{"type": "essay", "question": MarkdownString("*a* question")}],
+    }
+    transcoder = MarkdownTranscoder(yaml_data)
+
+    latex = {"fmt": "latex", "template": "exam.tex.j2", "html_css": "ignored"}
+    latex_solutions = {"fmt": "latex", "template": "exam-solutions.tex.j2"}
+    assert transcoder.transcode_target(latex) is transcoder.transcode_target(latex_solutions)
+
+    bb = {"fmt": "html", "html_css": "em {color: red}", "user_pre": ""}
+    preview = {"fmt": "html", "html_css": "em {color: red}", "out": "quiz.html"}
+    other_css = {"fmt": "html", "html_css": "em {color: blue}"}
+    with patch("quizml.markdown.markdown.get_html_dict") as mock_get_html_dict:
+        mock_get_html_dict.side_effect = lambda doc, md_list, opts: {
+            md: opts["html_css"] for md in md_list
+        }
+        assert transcoder.transcode_target(bb) is transcoder.transcode_target(preview)
+        assert transcoder.transcode_target(bb) is not transcoder.transcode_target(other_css)
+    assert mock_get_html_dict.call_count == 2
+
+
+def test_split_sections_5000_entries():
+    from quizml.markdown.html_renderer import SECTION_HEADING_PATTERN
+    from quizml.markdown.utils import get_hash, split_sections
+
+    md_list = [f"entry {i}" for i in range(5000)]
+    hashes = {get_hash(md) for md in md_list}
+    rendered = "".join(
+        f'<h1 id="s{i}">{get_hash(md)}</h1>\n<p>{md}</p>\n<h1>user heading</h1>\n'
+        for i, md in enumerate(md_list)
+    )
+
+    sections = split_sections(rendered, SECTION_HEADING_PATTERN, hashes)
+    assert len(sections) == 5000
+    assert sections[get_hash("entry 42")] == "\n<p>entry 42</p>\n<h1>user heading</h1>\n"
+
+
+def test_latex_dict_keeps_entry_headings():
+    yaml_data = {
+        "header": {},
+        "questions": [
+            {"type": "essay", "question": MarkdownString("# Part A\n\nfirst")},
+            {"type": "essay", "question": MarkdownString("second")},
+        ],
+    }
+    d = MarkdownTranscoder(yaml_data).get_dict(opts={"fmt": "latex"})
+    assert d["# Part A\n\nfirst"] == "\\section{Part A}\n\nfirst"
+    assert d["second"] == "second"
+
+
+def test_html_assets(tmp_path):
+    pkg_dirname = os.path.dirname(__file__)
+    image = os.path.join(pkg_dirname, "fixtures", "figures", "dogcat.jpg")
+    md = f"![pic]({image}) and ![pic]({image}){{width=10em}}"
+    yaml_data = {"header": {}, "questions": [{"type": "essay", "question": MarkdownString(md)}]}
+
+    opts = {"fmt": "html", "assets": True, "out": str(tmp_path / "quiz.html")}
+    html = MarkdownTranscoder(yaml_data).get_dict(opts=opts)[md]
+
+    assets = list((tmp_path / "quiz_assets").iterdir())
+    assert len(assets) == 1 and assets[0].suffix == ".jpg"
+    with open(image, "rb") as f:
+        assert assets[0].read_bytes() == f.read()
+    assert "data:image" not in html
+    assert html.count(f'src="quiz_assets/{assets[0].name}"') == 2
+
+    # the assets are written again on a cached build
+    assets[0].unlink()
+    html_cached = MarkdownTranscoder(yaml_data).get_dict(opts=opts)[md]
+    assert html_cached == html
+    assert assets[0].exists()
+
+
+def test_embed_image_memoized(tmp_path):
+    from quizml.markdown import image_embedding
+
+    pkg_dirname = os.path.dirname(__file__)
+    image = tmp_path / "dogcat.jpg"
+    with open(os.path.join(pkg_dirname, "fixtures", "figures", "dogcat.jpg"), "rb") as f:
+        image.write_bytes(f.read())
+
+    with patch.object(
+        image_embedding, "embed_base64", wraps=image_embedding.embed_base64
+    ) as mock_embed_base64:
+        embedding = image_embedding.embed_image(str(image))
+        assert image_embedding.embed_image(str(image)) == embedding
+
+        # read from the persistent cache in a new process
+        image_embedding._image_memo.clear()
+        assert image_embedding.embed_image(str(image)) == embedding
+        assert mock_embed_base64.call_count == 1
+
+        # the image is embedded again when it changes
+        st = image.stat()
+        os.utime(image, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+        assert image_embedding.embed_image(str(image)) == embedding
+        assert mock_embed_base64.call_count == 2
+
+
+def test_rasterize_many(tmp_path):
+    from PIL import Image
+
+    from quizml.exceptions import MarkdownImageError
+    from quizml.markdown import image_embedding
+
+    pdfs = []
+    for i in range(4):
+        pdfs.append(str(tmp_path / f"fig{i}.pdf"))
+        with open(pdfs[-1], "w") as f:
+            f.write(f"%PDF figure {i}")
+
+    def fake_rasterize_pdf(pdf_filename, png_filename, resolution):
+        if pdf_filename.endswith("fig3.pdf"):
+            raise MarkdownImageError("broken PDF")
+        Image.new("RGB", (4, 3)).save(png_filename)
+
+    cwd = os.getcwd()
+    with patch.object(
+        image_embedding, "rasterize_pdf", side_effect=fake_rasterize_pdf
+    ) as mock_rasterize_pdf:
+        pngs = image_embedding.rasterize_many(pdfs, jobs=4)
+        assert sorted(pngs) == pdfs[:3]
+        assert all(png.startswith(b"\x89PNG") for png in pngs.values())
+        assert mock_rasterize_pdf.call_count == 4
+
+        # the PNGs are stored in the cache database, keyed by PDF content
+        assert image_embedding.get_pdf_png(pdfs[0]) == pngs[pdfs[0]]
+        assert cache.get_cache_stats()["entries"] == 3
+        assert not (cache.get_cache_dir() / "figures").exists()
+        assert image_embedding.embed_pdf(pdfs[1])[:2] == (4, 3)
+        assert mock_rasterize_pdf.call_count == 4
+
+        with pytest.raises(MarkdownImageError):
+            image_embedding.embed_pdf(pdfs[3])
+
+    assert os.getcwd() == cwd
@@ -4,7 +4,7 @@ import tempfile
 import pytest
 
 from quizml.exceptions import Jinja2SyntaxError
-from quizml.renderer import render, render_template
+from quizml.renderer import get_environment, render, render_template, render_to_file
 
 
 def test_render_template_success():
@@ -54,3 +54,44 @@ def test_render_function():
 def test_render_missing_template():
     with pytest.raises(Jinja2SyntaxError):
         render_template({}, "")
+
+def test_render_template_reuses_environment(tmp_path):
+    template = tmp_path / "t.j2"
+    template.write_text("v1 << name >>")
+    assert render_template({'name': 'a'}, str(template)) == "v1 a"
+
+    # the compiled template is reused until the file changes
+    env = get_environment()
+    assert env.get_template(str(template)) is env.get_template(str(template))
+
+    template.write_text("v2 << name >>")
+    os.utime(template, (0, template.stat().st_mtime + 1))
+    assert render_template({'name': 'b'}, str(template)) == "v2 b"
+    assert get_environment() is env
+
+def test_render_template_not_found(tmp_path):
+    with pytest.raises(Jinja2SyntaxError, match="not found"):
+        render_template({}, str(tmp_path / "missing.j2"))
+
+def test_render_to_file(tmp_path):
+    template = tmp_path / "t.j2"
+    template.write_text("<| for q in questions |><< q.question >>;<| endfor |>")
+    out = tmp_path / "out.txt"
+
+    yaml_data = {'header': {}, 'questions': [{'question': i} for i in range(1000)]}
+    render_to_file(yaml_data, str(template), str(out))
+
+    assert out.read_text() == render(yaml_data, str(template))
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["out.txt", "t.j2"]
+
+def test_render_to_file_error_keeps_previous_output(tmp_path):
+    template = tmp_path / "t.j2"
+    template.write_text("start << header.missing.attribute >>")
+    out = tmp_path / "out.txt"
+    out.write_text("previous build")
+
+    with pytest.raises(Jinja2SyntaxError):
+        render_to_file({'header': {}, 'questions': []}, str(template), str(out))
+
+    assert out.read_text() == "previous build"
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["out.txt", "t.j2"]
@@ -0,0 +1,92 @@
+import threading
+import time
+
+from quizml.cli.scheduler import FAIL, OK, SKIP, UP_TO_DATE, Task, get_deps, run_tasks
+
+
+def test_get_deps():
+    assert get_deps({}) == []
+    assert get_deps({"dep": "latex"}) == ["latex"]
+    assert get_deps({"dep": ["latex", "bb"]}) == ["latex", "bb"]
+
+
+def test_run_tasks_concurrently():
+    # both tasks must be running at the same time to get past the barrier
+    barrier = threading.Barrier(2, timeout=5)
+
+    def job():
+        barrier.wait()
+        return True
+
+    tasks = [Task("a", run=job), Task("b", run=job)]
+    run_tasks(tasks, jobs=2)
+
+    assert [task.status for task in tasks] == [OK, OK]
+
+
+def test_run_tasks_dependencies_and_failures():
+    order = []
+
+    def job(name, success=True):
+        def run():
+            time.sleep(0.01)
+            order.append(name)
+            return success
+
+        return run
+
+    tasks = [
+        Task("pdf", run=job("pdf"), deps=["latex"]),
+        Task("latex", run=job("latex")),
+        Task("bb", run=job("bb", success=False)),
+        Task("upload", run=job("upload"), deps=["bb"]),
+        Task("orphan", run=job("orphan"), deps=["missing"]),
+    ]
+    run_tasks(tasks, jobs=4)
+
+    assert {task.name: task.status for task in tasks} == {
+        "pdf": OK,
+        "latex": OK,
+        "bb": FAIL,
+        "upload": SKIP,
+        "orphan": SKIP,
+    }
+    assert order.index("latex") < order.index("pdf")
+    assert "upload" not in order
+    assert all(task.wall_time > 0 for task in tasks if task.status != SKIP)
+
+
+def test_run_tasks_prepare_on_main_thread():
+    prepare_threads = []
+
+    def prepare(success):
+        prepare_threads.append(threading.current_thread())
+        return (lambda: True) if success else None
+
+    tasks = [
+        Task("html", prepare=lambda: prepare(True)),
+        Task("latex", prepare=lambda: prepare(False)),
+        Task("pdf", run=lambda: True, deps=["latex"]),
+    ]
+    run_tasks(tasks)
+
+    assert prepare_threads == [threading.main_thread()] * 2
+    assert [task.status for task in tasks] == [OK, FAIL, SKIP]
+
+
+def test_run_tasks_circular_dependencies():
+    tasks = [Task("a", run=lambda: True, deps=["b"]), Task("b", run=lambda: True, deps=["a"])]
+    run_tasks(tasks)
+    assert [task.status for task in tasks] == [SKIP, SKIP]
+
+
+def test_run_tasks_up_to_date():
+    ran = []
+    tasks = [
+        Task("latex", run=lambda: ran.append("latex") or True, up_to_date=True),
+        Task("pdf", run=lambda: ran.append("pdf") or True, deps=["latex"]),
+    ]
+    run_tasks(tasks)
+
+    assert [task.status for task in tasks] == [UP_TO_DATE, OK]
+    assert ran == ["pdf"]
@@ -1,5 +1,7 @@
 
+import json
 import os
+from pathlib import Path
 
 import pytest
 
@@ -32,3 +34,183 @@ def test_missing_file():
     with pytest.raises(QuizMLYamlSyntaxError) as excinfo:
         load("non_existent_file.yaml")
     assert "Yaml file not found" in str(excinfo.value)
+
+
+def test_compiled_schema_registry(tmp_path):
+    from quizml.cli.filelocator import locate
+    from quizml.loader import get_compiled_schema
+
+    schema_path = tmp_path / "schema.json"
+    schema_path.write_text(Path(locate.path("schema.json")).read_text())
+    yaml_file = os.path.join(os.path.dirname(__file__), "fixtures", "test-basic-syntax.yaml")
+
+    compiled = get_compiled_schema(schema_path)
+    doc, schema = load(yaml_file, schema_path=schema_path)
+    assert get_compiled_schema(schema_path) is compiled
+    assert schema is compiled.schema
+
+    # the schema is compiled again when the file changes
+    schema_path.write_text(json.dumps(compiled.schema, indent=2))
+    assert get_compiled_schema(schema_path) is not compiled
+
+    schema_path.write_text("{")
+    with pytest.raises(QuizMLYamlSyntaxError, match="Invalid JSON in schema"):
+        get_compiled_schema(schema_path)
+
+
+def test_apply_conditions_branches():
+    from quizml.cli.filelocator import locate
+    from quizml.utils import apply_conditions, compile_conditions
+
+    schema = json.loads(Path(locate.path("schema.json")).read_text())
+    branches = compile_conditions(schema)
+    items_schema = schema["items"]
+    assert id(items_schema) in branches
+
+    for question in [{"type": "mc"}, {"type": "essay"}, {"type": "unknown"}, {}]:
+        assert apply_conditions(question, items_schema, branches) is apply_conditions(
+            question, items_schema
+        )
+
+
+@pytest.mark.parametrize("libyaml", [True, False])
+def test_fast_loader(monkeypatch, libyaml):
+    from quizml import loader
+
+    if not libyaml:
+        monkeypatch.setattr(loader, "LibyamlStringLoader", None)
+
+    pkg_dirname = os.path.dirname(__file__)
+    for name in ["test-basic-syntax.yaml", "test-markdown.yaml"]:
+        yaml_file = os.path.join(pkg_dirname, "fixtures", name)
+        assert load(yaml_file, fast=True) == load(yaml_file, fast=False)
+
+    # scalars are loaded as the same strings by both loaders
+    text = "- type: essay\n  question: a\n  date: 2024-01-15\n  time: 2024-01-15 10:30:00\n"
+    fast_doc, _ = loader.loads(text, validate=False, fast=True)
+    slow_doc, _ = loader.loads(text, validate=False, fast=False)
+    assert fast_doc == slow_doc
+    assert fast_doc["questions"][0]["date"] == "2024-01-15"
+    assert isinstance(slow_doc["questions"][0]["time"], str)
+
+    # merge keys are left to the round-trip loader
+    text = "- &q\n  type: essay\n  question: a\n- <<: *q\n  question: b\n"
+    doc, _ = loader.loads(text, validate=False)
+    assert doc["questions"][1] == {"type": "essay", "question": "b"}
+
+    # errors are still reported with their line number
+    from quizml.cli.filelocator import locate
+
+    schema = loader.get_compiled_schema(locate.path("schema.json"))
+    text = "- type: essay\n  question: a\n- type: tf\n  question: b\n"
+    with pytest.raises(QuizMLYamlSyntaxError, match=r"line ~3"):
+        loader.loads(text, schema=schema)
+
+
+def test_load_cache(tmp_path):
+    from unittest.mock import patch
+
+    from quizml import loader
+    from quizml.utils import MarkdownString
+
+    pkg_dirname = os.path.dirname(__file__)
+    yaml_file = tmp_path / "quiz.yaml"
+    yaml_file.write_text(
+        Path(pkg_dirname, "fixtures", "test-basic-syntax.yaml").read_text()
+    )
+
+    doc, schema = load(yaml_file)
+    with patch.object(loader, "loads") as mock_loads:
+        cached_doc, cached_schema = load(yaml_file)
+    mock_loads.assert_not_called()
+    assert cached_doc == doc and cached_schema is schema
+    assert cached_doc is not doc
+    assert isinstance(cached_doc["questions"][0]["question"], MarkdownString)
+    assert cached_doc["header"]["inputbasename"] == str(tmp_path / "quiz")
+
+    # the document is loaded again when the file changes
+    yaml_file.write_text(yaml_file.read_text().replace("answer this", "answer that"))
+    doc, _ = load(yaml_file)
+    assert doc["questions"][0]["question"].startswith("answer that question")
+
+
+def test_coercion_plan():
+    from quizml.cli.filelocator import locate
+    from quizml.utils import CoercionPlan, MarkdownString, coerce_data
+
+    schema = json.loads(Path(locate.path("schema.json")).read_text())
+    plan = CoercionPlan(schema)
+    questions = [
+        {"type": "mc", "marks": "2.5", "cols": "2", "question": "q", "choices": [{"x": "a"}]},
+        {"type": "tf", "marks": "1", "question": "q", "answer": "no"},
+        {"type": "essay", "marks": "abc", "question": "q", "extra": "1"},
+        {"type": "unknown", "marks": "2"},
+    ]
+    doc = coerce_data({"header": {}, "questions": questions}, schema, plan)
+
+    mc, tf, essay, unknown = doc["questions"]
+    assert mc["marks"] == 2.5 and mc["cols"] == 2
+    assert isinstance(mc["question"], MarkdownString)
+    assert isinstance(mc["choices"][0]["x"], MarkdownString)
+    assert tf["answer"] is False and tf["marks"] == 1.0
+    assert essay["marks"] == "abc" and essay["extra"] == "1"
+    assert unknown == {"type": "unknown", "marks": "2"}
+    assert doc["questions"][0] is questions[0]
+
+
+@pytest.mark.parametrize("parallel", [False, True])
+def test_validate_all_errors(monkeypatch, parallel):
+    from quizml import loader
+    from quizml.cli.filelocator import locate
+
+    if parallel:
+        monkeypatch.setattr(loader, "PARALLEL_VALIDATION_MIN_ITEMS", 4)
+    schema = loader.get_compiled_schema(locate.path("schema.json"))
+
+    text = "".join(f"- type: essay\n  question: q{i}\n" for i in range(8))
+    text += "- type: tf\n  question: a\n"
+    text += "- type: essay\n  question: b\n  marks: abc\n"
+
+    with pytest.raises(QuizMLYamlSyntaxError) as excinfo:
+        loader.loads(text, schema=schema, jobs=2)
+    msg = str(excinfo.value)
+    assert msg.startswith("Schema validation error")
+    assert "at '8' (line ~17)" in msg and "'answer' is a required property" in msg
+    assert "at '9 -> marks' (line ~21)" in msg and "'abc' is not of type" in msg
+
+    # the defaults are filled in by the workers
+    doc, _ = loader.loads(text.split("- type: tf")[0], schema=schema, jobs=2)
+    assert [q["marks"] for q in doc["questions"]] == [4.0] * 8
+
+
+def test_validate_errors_deduplicated(monkeypatch):
+    from quizml import loader
+    from quizml.cli.filelocator import locate
+
+    schema = loader.get_compiled_schema(locate.path("schema.json"))
+    yaml_file = Path(__file__).parent / "fixtures" / "test-incorrect-02.yaml"
+
+    with pytest.raises(QuizMLYamlSyntaxError) as excinfo:
+        load(str(yaml_file))
+    assert str(excinfo.value).count("Schema validation error") == 3
+
+    # a missing or invalid type is reported alone
+    data = [{"u": 0, "v": "toto"}, {"type": 3, "question": "q"}]
+    assert loader.validate_data(schema, data) == [
+        ((0,), "'type' is a required property"),
+        ((1, "type"), "3 is not of type 'string'"),
+    ]
+
+    # errors without a schema path (eg. from the root schema) are kept
+    from types import SimpleNamespace
+
+    from jsonschema.exceptions import ValidationError
+
+    def descend(item, items_schema, path=None):
+        yield ValidationError("invalid question", path=[path])
+
+    monkeypatch.setattr(schema, "validator", SimpleNamespace(descend=descend))
+    assert loader.validate_data(schema, data) == [
+        ((0,), "invalid question"),
+        ((1,), "invalid question"),
+    ]